@@ -1,8 +1,10 @@
 from dotenv import load_dotenv
 import os
-import time
 import praw
 
+import variants
+from http_client import session
+
 load_dotenv()  # Load environment variables from .env file
 
 reddit_client_id = os.getenv(
@@ -20,7 +22,8 @@ REDDIT_USERNAME = reddit_username
 REDDIT_PASSWORD = reddit_password
 REDDIT_USER_AGENT = reddit_user_agent
 SUBREDDIT_NAME = subreddit_name
-IMAGE_FOLDER = "./tmdb_backgrounds"
+# With several output sizes configured, post the largest one
+IMAGE_FOLDER = os.path.join("./tmdb_backgrounds", variants.subfolders()[0])
 
 # 🔑 Authentication
 reddit = praw.Reddit(
@@ -29,6 +32,8 @@ reddit = praw.Reddit(
     username=REDDIT_USERNAME,
     password=REDDIT_PASSWORD,
     user_agent=REDDIT_USER_AGENT,
+    # Route Reddit API calls through the shared pooled, rate-limited session
+    requestor_kwargs={"session": session},
 )
 
 
@@ -38,7 +43,6 @@ def delete_own_posts(subreddit_name):
         if submission.subreddit.display_name.lower() == subreddit_name.lower():
             print(f"Deleting post: {submission.title}")
             submission.delete()
-            time.sleep(2)  # Avoid rate limits
 
 
 def is_moderator(subreddit):
@@ -60,7 +64,6 @@ def delete_non_generated_posts(subreddit_name, image_titles):
         ):
             print(f"Deleting post: {submission.title}")
             submission.delete()
-            time.sleep(2)  # Avoid rate limits
         else:
             titles.add(submission.title)
     return titles
@@ -95,8 +98,6 @@ def upload_images(subreddit_name, folder_path):
         except Exception as e:
             print(f"❌ Failed to approve: {e}")
 
-        time.sleep(2)  # Avoid rate limits
-
 
 def upload_new_images(subreddit_name, folder_path, existing_titles):
     """Upload only new images that have not been posted before."""
@@ -129,8 +130,6 @@ def upload_new_images(subreddit_name, folder_path, existing_titles):
         except Exception as e:
             print(f"❌ Failed to approve: {e}")
 
-        time.sleep(2)  # Avoid rate limits
-
 
 def main():
     # Get the set of image filenames (without extension) in the folder
@@ -1,14 +1,28 @@
 from dotenv import load_dotenv
-import requests
-from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance
+from PIL import Image, ImageFilter, ImageEnhance
 from io import BytesIO
+import asyncio
+import functools
+import heapq
 import os
-import shutil
 from urllib.request import urlopen
 import textwrap
 from datetime import datetime, timedelta
 import re
 
+import backdrops
+import encoder
+import fonts
+import http_cache
+import image_cache
+import logos
+import render_manifest
+import template
+import text_layout
+import tmdb_items
+from concurrent.futures import ThreadPoolExecutor
+from http_client import session
+
 load_dotenv()  # take environment variables from .env.
 
 # If TMDB API Read Access Token key is not hardcoded, then load from environment variables
@@ -48,7 +62,7 @@ truetype_url = (
 truetype_path = "Roboto-Light.ttf"
 if not os.path.exists(truetype_path):
     try:
-        response = requests.get(truetype_url, timeout=10)
+        response = session.get(truetype_url, timeout=10)
         if response.status_code == 200:
             with open(truetype_path, "wb") as f:
                 f.write(response.content)
@@ -60,8 +74,37 @@ if not os.path.exists(truetype_path):
     except Exception as e:
         print(f"An error occurred while downloading the Roboto-Light font: {e}")
 
+# Make sure the font can draw the metadata language before rendering anything
+fonts.check_coverage(truetype_path, language)
+
 movies_max = 10  # specify the maximum number of movies to fetch
 tvshows_max = 10  # specify the maximum number of TV shows to fetch
+max_source_pages = 5  # pages read at most from each trending/discover list, only while fewer titles than the maximum pass the filters
+candidate_sort_key = "vote_average"  # list result field candidates are ranked by, best first
+
+# Concurrency: TMDB requests and downloads run on io_workers threads, at most
+# max_concurrent_items titles are fetched at once, and rendering runs on its own thread
+# so it overlaps with the network
+io_workers = 10
+max_concurrent_items = 8
+
+io_pool = ThreadPoolExecutor(max_workers=io_workers)
+# One render thread: PIL font objects are shared between renders and are not thread-safe
+render_pool = ThreadPoolExecutor(max_workers=1)
+
+
+async def run_io(func, *args, **kwargs):
+    """
+    Runs a blocking request (on the shared keep-alive session) in the I/O thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_pool, functools.partial(func, *args, **kwargs))
+
+
+async def get_json(request_url, params=None):
+    response = await run_io(http_cache.get, request_url, headers=headers, params=params)
+    return response.json()
+
 # Endpoint for trending shows
 trending_movies_url = f"{url}trending/movie/week?language={language}"
 trending_tvshows_url = f"{url}trending/tv/week?language={language}"
@@ -69,80 +112,43 @@ trending_tvshows_url = f"{url}trending/tv/week?language={language}"
 # Endpoint for discover shows
 start_date = (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d")
 end_date = datetime.now().strftime("%Y-%m-%d")
-discover_movies_url = f"{url}discover/movie?sort_by=popularity.desc&language={language}&include_adult=false&page=1&with_release_type=4|5|6&include_video=false&vote_average.gte=1&vote_count.gte=50&with_runtime.gte=15&without_genres=99&release_date.gte={start_date}&release_date.lte={end_date}"
-discover_tvshows_url = f"{url}discover/tv?sort_by=popularity.desc&language={language}&include_adult=false&page=1&vote_average.gte=1&vote_count.gte=50&with_runtime.gte=15&without_genres=99|16&first_air_date.gte={start_date}&first_air_date.lte={end_date}"
-
-# Fetching trending movies
-trending_movies_response = requests.get(trending_movies_url, headers=headers)
-trending_movies = trending_movies_response.json()
-
-# Fetching trending TV shows
-trending_tvshows_response = requests.get(trending_tvshows_url, headers=headers)
-trending_tvshows = trending_tvshows_response.json()
-
-# Fetching discover movies
-discover_movies_response = requests.get(discover_movies_url, headers=headers)
-discover_movies = discover_movies_response.json()
-
-# Fetching discover TV shows
-discover_tvshows_response = requests.get(discover_tvshows_url, headers=headers)
-discover_tvshows = discover_tvshows_response.json()
-
-# Fetching genres for movies
-genres_url = f"{url}genre/movie/list?language={language}"
-genres_response = requests.get(genres_url, headers=headers)
-genres_data = genres_response.json()
-movie_genres = {genre["id"]: genre["name"] for genre in genres_data.get("genres", [])}
-
-# Fetching genres for TV shows
-genres_url = f"{url}genre/tv/list?language={language}"
-genres_response = requests.get(genres_url, headers=headers)
-genres_data = genres_response.json()
-tv_genres = {genre["id"]: genre["name"] for genre in genres_data.get("genres", [])}
-
-
-# Fetching TV show details
-def get_tv_show_details(tv_id):
-    tv_details_url = f"{url}tv/{tv_id}?language={language}"
-    tv_details_response = requests.get(tv_details_url, headers=headers)
-    return tv_details_response.json()
-
-
-# Fetching movie details
-def get_movie_details(movie_id):
-    movie_details_url = f"{url}movie/{movie_id}?language={language}"
-    movie_details_response = requests.get(movie_details_url, headers=headers)
-    return movie_details_response.json()
-
-
-# Function to fetch keywords for a movie
-def get_movie_keywords(movie_id):
-    keywords_url = f"{url}movie/{movie_id}/keywords"
-    response = requests.get(keywords_url, headers=headers)
-    if response.status_code == 200:
-        # Extract and return the names of the keywords
-        return [
-            keyword["name"].lower() for keyword in response.json().get("keywords", [])
-        ]
-    return []
-
-
-# Function to fetch keywords for a TV show
-def get_tv_keywords(tv_id):
-    keywords_url = f"{url}tv/{tv_id}/keywords"
-    response = requests.get(keywords_url, headers=headers)
-    if response.status_code == 200:
-        return [
-            keyword["name"].lower() for keyword in response.json().get("results", [])
-        ]
-    return []
-
-
-# Create a directory to save the backgrounds and clear its contents if it exists
+discover_movies_url = f"{url}discover/movie?sort_by=popularity.desc&language={language}&include_adult=false&with_release_type=4|5|6&include_video=false&vote_average.gte=1&vote_count.gte=50&with_runtime.gte=15&without_genres=99&release_date.gte={start_date}&release_date.lte={end_date}"
+discover_tvshows_url = f"{url}discover/tv?sort_by=popularity.desc&language={language}&include_adult=false&vote_average.gte=1&vote_count.gte=50&with_runtime.gte=15&without_genres=99|16&first_air_date.gte={start_date}&first_air_date.lte={end_date}"
+
+# Fetching trending and discover movies and TV shows and the genre lists, all at once
+async def fetch_bootstrap():
+    return await asyncio.gather(
+        get_json(trending_movies_url),
+        get_json(trending_tvshows_url),
+        get_json(discover_movies_url, {"page": 1}),
+        get_json(discover_tvshows_url, {"page": 1}),
+        get_json(f"{url}genre/movie/list?language={language}"),
+        get_json(f"{url}genre/tv/list?language={language}"),
+    )
+
+
+(
+    trending_movies,
+    trending_tvshows,
+    discover_movies,
+    discover_tvshows,
+    movie_genres_data,
+    tv_genres_data,
+) = asyncio.run(fetch_bootstrap())
+movie_genres = {genre["id"]: genre["name"] for genre in movie_genres_data.get("genres", [])}
+tv_genres = {genre["id"]: genre["name"] for genre in tv_genres_data.get("genres", [])}
+
+
+# Directory to save the backgrounds; unchanged backgrounds are kept between runs and
+# those of titles no longer selected are removed at the end
 background_dir = "tmdb_backgrounds"
-if os.path.exists(background_dir):
-    shutil.rmtree(background_dir)
-os.makedirs(background_dir, exist_ok=True)
+manifest = render_manifest.RenderManifest(background_dir)
+
+# Background, overlay and TMDB logo, composited once for all images
+background_template = template.get_template("tmdblogo.png", (210, 730))
+
+# Fingerprint of the template images, font and output settings shared by every background
+template_fingerprint = render_manifest.template_fingerprint("tmdblogo.png", truetype_path)
 
 
 # truncate overview
@@ -161,13 +167,6 @@ def truncate(overview, max_chars):
         return overview
 
 
-# resize image
-def resize_image(image, height):
-    ratio = height / image.height
-    width = int(image.width * ratio)
-    return image.resize((width, height))
-
-
 def resize_logo(image, width, height):
     # Get the aspect ratio of the image
     aspect_ratio = image.width / image.height
@@ -195,50 +194,37 @@ def clean_filename(filename):
     return cleaned_filename
 
 
-# Fetch movie or TV show logo
-def get_logo(media_type, media_id, language=language_short):
-    logo_url = f"{url}{media_type}/{media_id}/images?language={language}"
-    logo_response = requests.get(logo_url, headers=headers)
-    logo_data = logo_response.json()
-    if logo_response.status_code == 200:
-        logos = logo_response.json().get("logos", [])
-        for logo in logos:
-            if logo["iso_639_1"] == language_short and logo["file_path"].endswith(
-                ".png"
-            ):
-                return logo["file_path"]
-    return None
+# Output file name of a title, with the extension of the configured output format
+def background_filename(title):
+    return f"{clean_filename(title)}{encoder.extension()}"
 
 
 def process_image(
-    image_url, title, is_movie, genre, year, rating, duration=None, seasons=None
+    image_bytes,
+    title,
+    is_movie,
+    genre,
+    year,
+    rating,
+    duration=None,
+    seasons=None,
+    logo_bytes=None,
+    custom_text="",
 ):
-    # Download the background image with a timeout of 10 seconds
-    response = requests.get(image_url, timeout=10)
-    if response.status_code == 200:
-        # Open the image
-        image = Image.open(BytesIO(response.content))
+    # Render from the downloaded background and logo; runs on the render thread.
+    # Returns the finished canvas, or None if there is no background
+    if image_bytes:
+        # Decode the image at a height of 1500 pixels while preserving aspect ratio
+        image = backdrops.open_backdrop(image_bytes, 1500)
 
-        # Resize the image to have a width of 1500 pixels while preserving aspect ratio
-        image = resize_image(image, 1500)
-
-        # Open overlay images
-        bckg = Image.open(os.path.join(os.path.dirname(__file__), "bckg.png"))
-        overlay = Image.open(os.path.join(os.path.dirname(__file__), "overlay.png"))
-        tmdblogo = Image.open(os.path.join(os.path.dirname(__file__), "tmdblogo.png"))
-
-        # Paste images
-        bckg.paste(image, (1175, 0))
-        bckg.paste(overlay, (1175, 0), overlay)
-        bckg.paste(tmdblogo, (210, 730), tmdblogo)
-
-        # Add title text with shadow
-        draw = ImageDraw.Draw(bckg)
+        # Paste the image onto the precomposited background, overlay and TMDB logo
+        bckg = background_template.render(image, (1175, 0))
 
+        # Title and text are drawn with shadows through cached glyph masks
         # Text font
-        font_title = ImageFont.truetype(truetype_path, size=190)
-        font_overview = ImageFont.truetype(truetype_path, size=50)
-        font_custom = ImageFont.truetype(truetype_path, size=60)
+        font_title = fonts.get_font(truetype_path, 190)
+        font_overview = fonts.get_font(truetype_path, 50)
+        font_custom = fonts.get_font(truetype_path, 60)
 
         # Text color
         shadow_color = "black"
@@ -273,68 +259,48 @@ def process_image(
         info_text = f"{genre_text}  \u2022  {year_text}  \u2022  {additional_info}  \u2022  {rating_text}"
 
         # Draw metadata
-        draw.text(
-            (info_position[0] + shadow_offset, info_position[1] + shadow_offset),
-            info_text,
-            font=font_overview,
-            fill=shadow_color,
+        text_layout.draw_text_with_shadow(
+            bckg, info_position, info_text, font_overview, overview_color, shadow_color,
+            shadow_offset=(shadow_offset, shadow_offset),
         )
-        draw.text(info_position, info_text, font=font_overview, fill=overview_color)
-
-        # Get logo image URL
-        if is_movie:
-            logo_path = get_logo("movie", movie["id"], language=language_short)
-        else:
-            logo_path = get_logo("tv", tvshow["id"], language=language_short)
 
         logo_drawn = False  # Flag to track if logo is drawn
 
-        if logo_path:
-            logo_url = f"https://image.tmdb.org/t/p/original{logo_path}"
-            logo_response = requests.get(logo_url)
-            if logo_response.status_code == 200:
-                try:
-                    logo_image = Image.open(BytesIO(logo_response.content))
-                    # Resize the logo image to fit within a box while maintaining aspect ratio
-                    logo_image = resize_logo(logo_image, 1000, 500)
-                    logo_position = (
-                        210,
-                        info_position[1] - logo_image.height - 25,
-                    )  # Position for logo
-                    logo_image = logo_image.convert("RGBA")
-
-                    # Paste the logo onto the image
-                    bckg.paste(logo_image, logo_position, logo_image)
-                    logo_drawn = True  # Logo was successfully drawn
-                except Exception as e:
-                    print(f"Failed to draw logo for {title}: {e}")
+        if logo_bytes:
+            try:
+                logo_image = Image.open(BytesIO(logo_bytes))
+                # Resize the logo image to fit within a box while maintaining aspect ratio
+                logo_image = resize_logo(logo_image, 1000, 500)
+                logo_position = (
+                    210,
+                    info_position[1] - logo_image.height - 25,
+                )  # Position for logo
+                logo_image = logo_image.convert("RGBA")
+
+                # Paste the logo onto the image
+                bckg.paste(logo_image, logo_position, logo_image)
+                logo_drawn = True  # Logo was successfully drawn
+            except Exception as e:
+                print(f"Failed to draw logo for {title}: {e}")
 
         if not logo_drawn:
             # Draw title text if logo is not available or failed to draw
-            draw.text(
-                (title_position[0] + shadow_offset, title_position[1] + shadow_offset),
-                title,
-                font=font_title,
-                fill=shadow_color,
+            text_layout.draw_text_with_shadow(
+                bckg, title_position, title, font_title, main_color, shadow_color,
+                shadow_offset=(shadow_offset, shadow_offset),
             )
-            draw.text(title_position, title, font=font_title, fill=main_color)
 
         # Draw custom text
-        draw.text(
-            (custom_position[0] + shadow_offset, custom_position[1] + shadow_offset),
-            custom_text,
-            font=font_custom,
-            fill=shadow_color,
+        text_layout.draw_text_with_shadow(
+            bckg, custom_position, custom_text, font_custom, metadata_color, shadow_color,
+            shadow_offset=(shadow_offset, shadow_offset), cache=True,
         )
-        draw.text(custom_position, custom_text, font=font_custom, fill=metadata_color)
 
-        # Save the resized image
-        filename = os.path.join(background_dir, f"{clean_filename(title)}.jpg")
-        bckg = bckg.convert("RGB")
-        bckg.save(filename)
-        print(f"Image saved: {filename}")
+        # The canvas is already RGB and is encoded by render()
+        return bckg
     else:
         print(f"Failed to download background for {title}")
+        return None
 
 
 # Filter criteria
@@ -342,7 +308,6 @@ def should_exclude_movie(
     movie,
     movie_excluded_countries=movie_excluded_countries,
     movie_excluded_genres=movie_excluded_genres,
-    excluded_keywords=excluded_keywords,
 ):
     # Check if the movie's country is in the excluded countries list
     country = movie.get("origin_country", "").lower()
@@ -350,31 +315,32 @@ def should_exclude_movie(
     # Check if any genre in the movie matches the excluded genres list
     genres = [movie_genres.get(genre_id, "") for genre_id in movie.get("genre_ids", [])]
 
-    # Fetch movie keywords
-    movie_keywords = get_movie_keywords(movie["id"]) if excluded_keywords else []
-
     # Check release date
     release_date_str = movie.get("release_date")
     release_date = (
         datetime.strptime(release_date_str, "%Y-%m-%d") if release_date_str else None
     )
 
-    # Return True if excluded by country, genre, keywords, or release date
+    # Return True if excluded by country, genre, or release date
     if (
         country in movie_excluded_countries
         or any(genre in movie_excluded_genres for genre in genres)
-        or any(keyword in movie_keywords for keyword in excluded_keywords)
         or (release_date and release_date < max_air_date)
     ):
         return True
     return False
 
 
+# Filter criteria that need the details request, checked only for movies passing the others
+def should_exclude_movie_details(item, excluded_keywords=excluded_keywords):
+    # Movie keywords, loaded with the details
+    return any(keyword in item.keywords for keyword in excluded_keywords)
+
+
 def should_exclude_tvshow(
     tvshow,
     tv_excluded_countries=tv_excluded_countries,
     tv_excluded_genres=tv_excluded_genres,
-    excluded_keywords=excluded_keywords,
 ):
     # Check if the TV show's country is in the excluded countries list
     country = tvshow.get("origin_country", [""])[0].lower()
@@ -382,24 +348,29 @@ def should_exclude_tvshow(
     # Check if any genre in the TV show matches the excluded genres list
     genres = [tv_genres.get(genre_id, "") for genre_id in tvshow.get("genre_ids", [])]
 
-    # Fetch TV show keywords
-    tv_keywords = get_tv_keywords(tvshow["id"]) if excluded_keywords else []
+    # Return True if excluded by country or genre
+    if country in tv_excluded_countries or any(
+        genre in tv_excluded_genres for genre in genres
+    ):
+        return True
+    return False
+
+
+# Filter criteria that need the details request, checked only for TV shows passing the others
+def should_exclude_tvshow_details(item, excluded_keywords=excluded_keywords):
+    # TV show keywords, loaded with the details
+    tv_keywords = item.keywords
 
     # Check next episode to air date
-    last_air_date_str = get_tv_show_details(tvshow["id"]).get("last_air_date")
+    last_air_date_str = item.last_air_date
     last_air_date = (
         datetime.strptime(last_air_date_str, "%Y-%m-%d") if last_air_date_str else None
     )
 
-    # Return True if excluded by country, genre, keywords, or next episode air date
-    if (
-        country in tv_excluded_countries
-        or any(genre in tv_excluded_genres for genre in genres)
-        or any(keyword in tv_keywords for keyword in excluded_keywords)
-        or (last_air_date and last_air_date < max_air_date)
-    ):
-        return True
-    return False
+    # Return True if excluded by keywords or next episode air date
+    return any(keyword in tv_keywords for keyword in excluded_keywords) or bool(
+        last_air_date and last_air_date < max_air_date
+    )
 
 
 def is_russian(text):
@@ -407,107 +378,294 @@ def is_russian(text):
     return bool(re.search(r"[а-яА-ЯёЁ]", text))
 
 
-# Process each movie
-
-movies = trending_movies.get("results", []) + discover_movies.get("results", [])
-# Sort movies by rating (descending)
-movies = sorted(movies, key=lambda m: m.get("vote_average", 0), reverse=True)
-
-# Limit to movies_max
-movies = movies[:movies_max]
-for movie in movies:
-    title = movie["title"]
-    if not is_russian(title):
-        continue
-    if should_exclude_movie(movie):
-        continue
-
-    # Extract movie details
-    title = movie["title"]
-    overview = movie["overview"]
-    year = movie["release_date"]
-    rating = round(movie["vote_average"], 1)
-    if rating < min_rating:
-        continue
-    genre = ", ".join([movie_genres[genre_id] for genre_id in movie["genre_ids"]])
-    print(f"Processing movie: {title} {rating}")
-    # Fetch additional movie details
-    movie_details = get_movie_details(movie["id"])
-    duration = movie_details.get("runtime", 0)
-
-    # Format duration as hours and minutes
-    if duration:
-        hours = duration // 60
-        minutes = duration % 60
-        duration = f"{hours}ч {minutes}мин"
-    else:
-        duration = "N/A"
-
-    # Check if backdrop image is available
-    backdrop_path = movie["backdrop_path"]
-    custom_text = ""  # "Now Trending on"
-    if backdrop_path:
-        # Construct image URL
-        image_url = f"https://image.tmdb.org/t/p/original{backdrop_path}"
-        # Process the image
-        process_image(
-            image_url,
-            title,
-            is_movie=True,
-            genre=genre,
-            year=year,
-            rating=rating,
-            duration=duration,
+# Local checks on a list result, before any request is made for it
+def is_movie_candidate(movie):
+    return (
+        is_russian(movie["title"])
+        and round(movie.get("vote_average", 0), 1) >= min_rating
+        and bool(movie.get("backdrop_path"))
+        and not should_exclude_movie(movie)
+    )
+
+
+def is_tvshow_candidate(tvshow):
+    return (
+        is_russian(truncate_overview(tvshow["name"], 38))
+        and round(tvshow.get("vote_average", 0), 1) >= min_rating
+        and bool(tvshow.get("backdrop_path"))
+        and not should_exclude_tvshow(tvshow)
+    )
+
+
+class CandidateSource:
+    """
+    One paged TMDB list (trending or discover), read a page at a time as candidates are needed.
+    """
+
+    def __init__(self, list_url, first_page=None, max_pages=max_source_pages):
+        """
+        :param list_url: List endpoint, without the page parameter.
+        :param first_page: Response of page 1 if it was already fetched.
+        :param max_pages: Number of pages read at most.
+        """
+        self.list_url = list_url
+        self.first_page = first_page
+        self.max_pages = max_pages
+        self.page = 0
+        self.total_pages = max_pages
+
+    async def next_page(self):
+        """
+        Returns the results of the next page ranked by candidate_sort_key, or [] once the list is exhausted.
+        """
+        if self.page >= min(self.max_pages, self.total_pages):
+            return []
+        self.page += 1
+        if self.page == 1 and self.first_page is not None:
+            data = self.first_page
+        else:
+            data = await get_json(self.list_url, {"page": self.page})
+        self.total_pages = data.get("total_pages", self.page)
+        return sorted(data.get("results", []), key=lambda r: r.get(candidate_sort_key) or 0, reverse=True)
+
+
+async def merge_candidates(sources):
+    """
+    Yields the results of several sources merged on a heap by candidate_sort_key,
+    each TMDB id only once. A source's next page is only requested when the results
+    already read from it are used up, so the merge only orders the results of the
+    pages fetched so far; a page not read yet can still hold results that rank above
+    ones already yielded.
+    """
+    pages = await asyncio.gather(*[source.next_page() for source in sources])
+    buffers = [list(reversed(page)) for page in pages]
+    heap = []
+    order = 0  # Keeps equal keys in source order and stops the heap from comparing dicts
+
+    async def push(index):
+        nonlocal order
+        if not buffers[index]:
+            buffers[index] = list(reversed(await sources[index].next_page()))
+        if buffers[index]:
+            result = buffers[index].pop()
+            heapq.heappush(heap, (-(result.get(candidate_sort_key) or 0), order, index, result))
+            order += 1
+
+    for index in range(len(sources)):
+        await push(index)
+
+    seen = set()
+    while heap:
+        _, _, index, result = heapq.heappop(heap)
+        await push(index)
+        if result["id"] not in seen:
+            seen.add(result["id"])
+            yield result
+
+
+async def select_titles(media_type, sources, max_count, is_candidate, should_exclude_details, semaphore):
+    """
+    Picks up to max_count titles, best first, in stages: the local checks run on each
+    merged list result, and the details request (keywords, last air date) only on titles
+    that passed them and only for as many as are still missing. Pages are only fetched
+    while more candidates are needed.
+
+    :param media_type: "movie" or "tv".
+    :param sources: CandidateSource lists to pick from.
+    :param max_count: Number of titles wanted.
+    :param is_candidate: Local check on a list result.
+    :param should_exclude_details: Check on the loaded TmdbItem.
+    :param semaphore: asyncio.Semaphore bounding the details requests in flight.
+    :return: List of (list result, TmdbItem) tuples.
+    """
+    selected = []
+    wave = []
+
+    async def load(result):
+        async with semaphore:
+            try:
+                return await run_io(tmdb_items.load_item, media_type, result["id"], headers, language=language)
+            except Exception as e:
+                print(f"Error loading TMDB {media_type} {result['id']}: {e}")
+                return None
+
+    async def load_wave():
+        # Load the details of the collected candidates at the same time
+        items = await asyncio.gather(*[load(result) for result in wave])
+        for result, item in zip(wave, items):
+            if item is not None and not should_exclude_details(item):
+                selected.append((result, item))
+        wave.clear()
+
+    candidates = merge_candidates(sources)
+    async for result in candidates:
+        if is_candidate(result):
+            wave.append(result)
+        # Enough candidates collected for the titles still missing
+        if len(wave) >= max_count - len(selected):
+            await load_wave()
+            if len(selected) >= max_count:
+                break
+    await candidates.aclose()
+    if wave:
+        await load_wave()
+    return selected
+
+
+# Download the backdrop and the logo of a title at the same time
+async def fetch_images(backdrop_path, logo):
+    return await asyncio.gather(
+        # Smallest TMDB size bucket that covers the 1500 pixel backdrop height
+        run_io(image_cache.fetch, backdrops.tmdb_backdrop_url(backdrop_path, 1500), timeout=10),
+        # Smallest TMDB size bucket that fills the 1000x500 logo box (w500 scaled up for wide logos)
+        run_io(logos.fetch_tmdb_logo, logo, 1000, 500) if logo else asyncio.sleep(0),
+    )
+
+
+async def render(fingerprint, **kwargs):
+    loop = asyncio.get_running_loop()
+    bckg = await loop.run_in_executor(render_pool, functools.partial(process_image, **kwargs))
+    if bckg is not None:
+        # Encode and write on the I/O threads, so the render thread moves on to the next title
+        filename = await run_io(manifest.save, bckg, background_filename(kwargs["title"]), fingerprint)
+        print(f"Image saved: {filename}")
+
+
+# Process a selected movie: download and render it
+async def process_movie(movie, item, semaphore):
+    async with semaphore:
+        # Extract movie details
+        title = movie["title"]
+        overview = movie["overview"]
+        year = movie["release_date"]
+        rating = round(movie["vote_average"], 1)
+        genre = ", ".join([movie_genres[genre_id] for genre_id in movie["genre_ids"]])
+        print(f"Processing movie: {title} {rating}")
+        duration = item.runtime or 0
+
+        # Format duration as hours and minutes
+        if duration:
+            hours = duration // 60
+            minutes = duration % 60
+            duration = f"{hours}ч {minutes}мин"
+        else:
+            duration = "N/A"
+
+        # Backdrop image, checked when the title was selected
+        backdrop_path = movie["backdrop_path"]
+        custom_text = ""  # "Now Trending on"
+
+        logo = item.logo(language_short)
+        logo_path = logo["file_path"] if logo else None
+
+        # Keep the existing background if nothing it was made from has changed
+        fingerprint = render_manifest.fingerprint(
+            "movie", movie["id"], backdrop_path, logo_path, title, genre, year,
+            rating, duration, custom_text, template_fingerprint,
         )
-    else:
-        # Print error message if no backdrop image found
-        print(f"No backdrop image found for {title}")
-
-
-# Process TV shows
-tvshows = trending_tvshows.get("results", []) + discover_tvshows.get("results", [])
-# Sort TV shows by rating (descending)
-tvshows = sorted(tvshows, key=lambda t: t.get("vote_average", 0), reverse=True)
-
-# Limit to tvshows_max
-tvshows = tvshows[:tvshows_max]
-for tvshow in tvshows:
-    title = truncate_overview(tvshow["name"], 38)
-    if not is_russian(title):
-        continue
-    if should_exclude_tvshow(tvshow):
-        continue
-
-    # Extract TV show details
-    title = truncate_overview(tvshow["name"], 38)
-    overview = tvshow["overview"]
-    year = tvshow["first_air_date"]
-    rating = round(tvshow["vote_average"], 1)
-    if rating < min_rating:
-        continue
-    genre = ", ".join([tv_genres[genre_id] for genre_id in tvshow["genre_ids"]])
-    print(f"Processing TV show: {title} {rating}")
-    # Fetch additional TV show details
-    tv_details = get_tv_show_details(tvshow["id"])
-    seasons = tv_details.get("number_of_seasons", 0)
-
-    # Check if backdrop image is available
-    backdrop_path = tvshow["backdrop_path"]
-    custom_text = ""  # "Now Trending on"
-    if backdrop_path:
-        # Construct image URL
-        image_url = f"https://image.tmdb.org/t/p/original{backdrop_path}"
-
-        # Process the image
-        process_image(
-            image_url,
-            title,
-            is_movie=False,
-            genre=genre,
-            year=year,
-            rating=rating,
-            seasons=seasons,
+        if manifest.is_current(background_filename(title), fingerprint):
+            print(f"Unchanged, keeping: {title}")
+            return
+
+        image_bytes, logo_bytes = await fetch_images(backdrop_path, logo)
+
+    # Render while other titles are downloading
+    await render(
+        image_bytes=image_bytes,
+        title=title,
+        is_movie=True,
+        genre=genre,
+        year=year,
+        rating=rating,
+        duration=duration,
+        logo_bytes=logo_bytes,
+        custom_text=custom_text,
+        fingerprint=fingerprint,
+    )
+
+
+# Process a selected TV show: download and render it
+async def process_tvshow(tvshow, item, semaphore):
+    async with semaphore:
+        # Extract TV show details
+        title = truncate_overview(tvshow["name"], 38)
+        overview = tvshow["overview"]
+        year = tvshow["first_air_date"]
+        rating = round(tvshow["vote_average"], 1)
+        genre = ", ".join([tv_genres[genre_id] for genre_id in tvshow["genre_ids"]])
+        print(f"Processing TV show: {title} {rating}")
+        seasons = item.number_of_seasons or 0
+
+        # Backdrop image, checked when the title was selected
+        backdrop_path = tvshow["backdrop_path"]
+        custom_text = ""  # "Now Trending on"
+
+        logo = item.logo(language_short)
+        logo_path = logo["file_path"] if logo else None
+
+        # Keep the existing background if nothing it was made from has changed
+        fingerprint = render_manifest.fingerprint(
+            "tv", tvshow["id"], backdrop_path, logo_path, title, genre, year,
+            rating, seasons, custom_text, template_fingerprint,
         )
-    else:
-        # Print error message if no backdrop image found
-        print(f"No backdrop image found for {title}")
+        if manifest.is_current(background_filename(title), fingerprint):
+            print(f"Unchanged, keeping: {title}")
+            return
+
+        image_bytes, logo_bytes = await fetch_images(backdrop_path, logo)
+
+    # Render while other titles are downloading
+    await render(
+        image_bytes=image_bytes,
+        title=title,
+        is_movie=False,
+        genre=genre,
+        year=year,
+        rating=rating,
+        seasons=seasons,
+        logo_bytes=logo_bytes,
+        custom_text=custom_text,
+        fingerprint=fingerprint,
+    )
+
+
+# Select and process all movies and TV shows concurrently
+async def process_all():
+    semaphore = asyncio.Semaphore(max_concurrent_items)
+    movies, tvshows = await asyncio.gather(
+        select_titles(
+            "movie",
+            [
+                CandidateSource(trending_movies_url, trending_movies),
+                CandidateSource(discover_movies_url, discover_movies),
+            ],
+            movies_max,
+            is_movie_candidate,
+            should_exclude_movie_details,
+            semaphore,
+        ),
+        select_titles(
+            "tv",
+            [
+                CandidateSource(trending_tvshows_url, trending_tvshows),
+                CandidateSource(discover_tvshows_url, discover_tvshows),
+            ],
+            tvshows_max,
+            is_tvshow_candidate,
+            should_exclude_tvshow_details,
+            semaphore,
+        ),
+    )
+
+    tasks = [process_movie(movie, item, semaphore) for movie, item in movies]
+    tasks += [process_tvshow(tvshow, item, semaphore) for tvshow, item in tvshows]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for (entry, item), result in zip(movies + tvshows, results):
+        if isinstance(result, Exception):
+            print(f"An error occurred while processing {item.title}: {result}")
+
+
+asyncio.run(process_all())
+
+# Remove backgrounds of titles that are no longer selected
+manifest.finish()
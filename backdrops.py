@@ -0,0 +1,59 @@
+# === Standard Library Imports ===
+import math
+from io import BytesIO
+
+# === Third-Party Imports ===
+from PIL import Image
+
+# Backdrop ingestion shared by all scripts.
+# Backdrops are drawn 1500px high, but sources are often 2160px or more. JPEGs are
+# decoded straight at the smallest DCT scale (1/2, 1/4 or 1/8) that still covers the
+# target with Image.draft, so a large original is never fully decoded, and the rest of
+# the way is a single Lanczos resample. For TMDB the smallest size bucket that is wide
+# enough is requested instead of the original file.
+
+# TMDB backdrop widths from /configuration, smallest first; "original" is used when none is wide enough
+tmdb_backdrop_sizes = [('w300', 300), ('w780', 780), ('w1280', 1280)]
+
+# Aspect ratio of TMDB backdrops, used to pick a size bucket before the image is known
+backdrop_aspect_ratio = 16 / 9
+
+
+def tmdb_backdrop_url(file_path, height):
+    """
+    Returns the URL of the smallest TMDB rendition of a backdrop that can be drawn at height.
+
+    :param file_path: Backdrop path from TMDB, e.g. "/abc.jpg".
+    :param height: Height in pixels the backdrop will be drawn at.
+    """
+    width = math.ceil(height * backdrop_aspect_ratio)
+    size = next((name for name, size_width in tmdb_backdrop_sizes if size_width >= width), 'original')
+    return f"https://image.tmdb.org/t/p/{size}{file_path}"
+
+
+def resize_to_height(image, height):
+    """
+    Resizes an image to height, keeping its aspect ratio, with a Lanczos filter.
+    """
+    width = max(1, round(image.width * height / image.height))
+    if (width, height) == image.size:
+        return image
+    return image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+
+
+def open_backdrop(source, height):
+    """
+    Decodes a backdrop at height, letting the JPEG decoder skip the detail that
+    the resize would throw away.
+
+    :param source: Encoded image bytes, or a file path.
+    :param height: Height in pixels the backdrop will be drawn at.
+    :return: RGB image resized to height.
+    """
+    image = Image.open(BytesIO(source) if isinstance(source, bytes) else source)
+    if image.format == 'JPEG' and image.height > height:
+        # The decoder picks the largest reduction whose result is still at least this size
+        image.draft('RGB', (math.ceil(image.width * height / image.height), height))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return resize_to_height(image, height)
@@ -0,0 +1,163 @@
+# === Standard Library Imports ===
+import os
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional
+
+# === Third-Party Imports ===
+from PIL import Image
+
+# AVIF is built into recent Pillow releases; older builds get it from the optional pillow-avif-plugin
+try:
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+# Output encoder shared by all scripts.
+# Backgrounds used to be saved with Pillow's JPEG defaults (quality 75, baseline, no
+# Huffman optimization). They are pulled by the TV launchers over Wi-Fi, so they are
+# now encoded by one stage with a selectable codec and quality preset: progressive,
+# optimized JPEG by default, or WebP, or AVIF when the Pillow build can write it.
+# An optional size limit searches for the highest quality whose file fits in it.
+# Settings come from the environment:
+#   OUTPUT_FORMAT   jpeg (default), webp or avif
+#   OUTPUT_PRESET   high, balanced (default) or small
+#   OUTPUT_QUALITY  overrides the preset's quality (1-100)
+#   OUTPUT_MAX_KB   largest file size in KB, unset for no limit
+# Reddit.py only uploads JPEG, PNG and GIF files, so keep JPEG for tmdb_backgrounds when posting to Reddit.
+
+# File extension of each output format
+extensions = {'JPEG': '.jpg', 'WEBP': '.webp', 'AVIF': '.avif'}
+format_aliases = {'JPG': 'JPEG'}
+
+# Quality and chroma subsampling presets (subsampling 0 = 4:4:4, 2 = 4:2:0)
+presets = {
+    'high': {'quality': 90, 'subsampling': 0},
+    'balanced': {'quality': 75, 'subsampling': 2},  # Pillow's old default quality, now progressive and optimized
+    'small': {'quality': 65, 'subsampling': 2},
+}
+
+# Lowest quality the size limit search goes down to
+min_quality = 40
+
+settings = None
+
+
+@dataclass(frozen=True)
+class EncoderSettings:
+    """
+    Output codec and quality used for every background.
+    """
+    format: str = 'JPEG'
+    quality: int = 75
+    subsampling: int = 2
+    max_bytes: Optional[int] = None
+
+
+def is_supported(image_format):
+    """
+    Returns whether this Pillow build can write image_format ("JPEG", "WEBP", "AVIF").
+    """
+    Image.init()
+    return image_format in Image.SAVE
+
+
+def load_settings():
+    """
+    Reads the encoder settings from the environment, falling back to JPEG when the
+    requested format is unknown or the Pillow build can't write it.
+    """
+    image_format = (os.getenv('OUTPUT_FORMAT') or 'JPEG').upper()
+    image_format = format_aliases.get(image_format, image_format)
+    if image_format not in extensions or not is_supported(image_format):
+        print(f"[WARNING] Output format {image_format} is not supported by this Pillow build, using JPEG.")
+        image_format = 'JPEG'
+
+    preset_name = (os.getenv('OUTPUT_PRESET') or 'balanced').lower()
+    if preset_name not in presets:
+        print(f"[WARNING] Unknown output preset {preset_name}, using balanced.")
+        preset_name = 'balanced'
+    preset = presets[preset_name]
+
+    quality = preset['quality']
+    try:
+        if os.getenv('OUTPUT_QUALITY'):
+            quality = min(max(int(os.getenv('OUTPUT_QUALITY')), 1), 100)
+    except ValueError:
+        print(f"[WARNING] Invalid OUTPUT_QUALITY, using {quality}.")
+
+    max_bytes = None
+    try:
+        if os.getenv('OUTPUT_MAX_KB'):
+            max_bytes = int(float(os.getenv('OUTPUT_MAX_KB')) * 1024) or None
+    except ValueError:
+        print("[WARNING] Invalid OUTPUT_MAX_KB, not limiting the file size.")
+
+    return EncoderSettings(image_format, quality, preset['subsampling'], max_bytes)
+
+
+def get_settings():
+    """
+    Returns the encoder settings, reading them from the environment the first time.
+    """
+    global settings
+    if settings is None:
+        settings = load_settings()
+    return settings
+
+
+def extension(encoder_settings=None):
+    """
+    Returns the file extension of the output format, e.g. ".jpg".
+    """
+    return extensions[(encoder_settings or get_settings()).format]
+
+
+def save_options(encoder_settings, quality):
+    """
+    Returns the Pillow save arguments for the output format at the given quality.
+    """
+    if encoder_settings.format == 'WEBP':
+        return {'quality': quality, 'method': 6}
+    if encoder_settings.format == 'AVIF':
+        return {'quality': quality, 'speed': 6,
+                'subsampling': '4:4:4' if encoder_settings.subsampling == 0 else '4:2:0'}
+    return {'quality': quality, 'subsampling': encoder_settings.subsampling,
+            'optimize': True, 'progressive': True}
+
+
+def encode_at(image, encoder_settings, quality):
+    """
+    Encodes an image at one quality and returns the bytes.
+    """
+    output = BytesIO()
+    image.save(output, format=encoder_settings.format, **save_options(encoder_settings, quality))
+    return output.getvalue()
+
+
+def encode(image, encoder_settings=None):
+    """
+    Encodes a background with the configured codec and quality.
+
+    With a size limit, the quality is lowered by binary search until the file fits,
+    down to min_quality; the smallest attempt is returned if even that doesn't fit.
+
+    :param image: RGB image to encode.
+    :param encoder_settings: EncoderSettings, defaults to those from the environment.
+    :return: Encoded image bytes.
+    """
+    encoder_settings = encoder_settings or get_settings()
+    data = encode_at(image, encoder_settings, encoder_settings.quality)
+    if not encoder_settings.max_bytes or len(data) <= encoder_settings.max_bytes:
+        return data
+
+    low, high = min_quality, encoder_settings.quality - 1
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        attempt = encode_at(image, encoder_settings, quality)
+        if len(attempt) <= encoder_settings.max_bytes:
+            best, low = attempt, quality + 1
+        else:
+            data, high = attempt, quality - 1
+    return best or data
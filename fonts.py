@@ -0,0 +1,110 @@
+# === Standard Library Imports ===
+import os
+import threading
+
+# === Third-Party Imports ===
+from PIL import Image, ImageDraw, ImageFont
+
+# Process-wide font registry shared by all renderers.
+# Every background draws its text with the same handful of faces, so each
+# (path, size, variation) is parsed from the TTF once and the FreeTypeFont is reused
+# for every item. check_coverage runs once at startup and reports characters of the
+# metadata language that the font has no glyph for, instead of every item silently
+# rendering them as boxes.
+
+# Characters each language needs beyond basic Latin, keyed by ISO 639-1 code
+language_samples = {
+    'ru': 'АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯабвгдеёжзийклмнопрстуфхцчшщъыьэюя',
+    'uk': 'АБВГҐДЕЄЖЗИІЇЙКЛМНОПРСТУФХЦЧШЩЬЮЯабвгґдеєжзиіїйклмнопрстуфхцчшщьюя',
+    'bg': 'АБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЬЮЯабвгдежзийклмнопрстуфхцчшщъьюя',
+    'el': 'ΑΒΓΔΕΖΗΘΙΚΛΜΝΞΟΠΡΣΤΥΦΧΨΩαβγδεζηθικλμνξοπρσςτυφχψωάέήίόύώ',
+    'de': 'ÄÖÜäöüß',
+    'fr': 'ÀÂÆÇÈÉÊËÎÏÔŒÙÛÜàâæçèéêëîïôœùûüÿ',
+    'es': 'ÁÉÍÑÓÚÜáéíñóúü¿¡',
+    'pt': 'ÁÂÃÀÇÉÊÍÓÔÕÚáâãàçéêíóôõú',
+    'it': 'ÀÈÉÌÒÙàèéìòù',
+    'pl': 'ĄĆĘŁŃÓŚŹŻąćęłńóśźż',
+    'cs': 'ÁČĎÉĚÍŇÓŘŠŤÚŮÝŽáčďéěíňóřšťúůýž',
+    'tr': 'ÇĞİÖŞÜçğıöşü',
+}
+basic_sample = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,:;!?\'"()-•'
+
+fonts = {}
+fonts_lock = threading.Lock()
+
+
+def get_font(path, size, variation=None):
+    """
+    Returns the font for path and size, loading it from disk only the first time.
+
+    :param path: Path to the TTF/OTF file.
+    :param size: Font size in pixels.
+    :param variation: Named instance (e.g. "Light") or tuple of axis values for variable fonts, or None.
+    :return: ImageFont.FreeTypeFont shared by every caller in this process.
+    """
+    key = (os.path.abspath(path), size, variation)
+    font = fonts.get(key)
+    if font is None:
+        with fonts_lock:
+            font = fonts.get(key)
+            if font is None:
+                font = ImageFont.truetype(path, size=size)
+                if isinstance(variation, str):
+                    font.set_variation_by_name(variation)
+                elif variation is not None:
+                    font.set_variation_by_axes(list(variation))
+                fonts[key] = font
+    return font
+
+
+def glyph_signature(font, char):
+    """
+    Returns the rendered pixels of one character, used to tell real glyphs from .notdef.
+    """
+    left, top, right, bottom = font.getbbox(char)
+    image = Image.new('L', (max(right - left, 1), max(bottom - top, 1)))
+    ImageDraw.Draw(image).text((-left, -top), char, font=font, fill=255)
+    return (left, top, right, bottom), image.tobytes()
+
+
+def missing_glyphs(path, text, variation=None):
+    """
+    Returns the characters of text that the font has no glyph for.
+
+    FreeType draws missing characters with the font's .notdef glyph, so a character
+    rendering exactly like an unassigned code point is missing from the font.
+    """
+    font = get_font(path, 48, variation)
+    notdef = glyph_signature(font, '\U0010FFFD')
+    missing = []
+    for char in dict.fromkeys(text):
+        if char.isspace():
+            continue
+        if glyph_signature(font, char) == notdef:
+            missing.append(char)
+    return ''.join(missing)
+
+
+def check_coverage(path, language=None, text='', variation=None):
+    """
+    Checks once, before rendering, that the font can draw the given language.
+
+    :param path: Path to the font file.
+    :param language: Metadata language such as "ru-RU" or "ru", or None for basic Latin only.
+    :param text: Extra characters the backgrounds will use (labels, custom text...).
+    :param variation: Font variation, as for get_font.
+    :return: True if every character is covered, False otherwise (a warning is printed).
+    """
+    sample = basic_sample + text
+    if language:
+        sample += language_samples.get(language.split('-')[0].lower(), '')
+    try:
+        missing = missing_glyphs(path, sample, variation)
+    except OSError as e:
+        print(f"[ERROR] Failed to load font {path}: {e}")
+        return False
+    if missing:
+        print(f"[WARNING] Font {path} has no glyphs for: {missing}"
+              f"{f' (language {language})' if language else ''}. These characters will render as boxes.")
+        return False
+    return True
@@ -0,0 +1,221 @@
+# === Standard Library Imports ===
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# === Third-Party Imports ===
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# === Local Imports ===
+from http_client import session
+
+# Persistent cache for JSON metadata responses (TMDB genres, trending, discover, details...).
+# Fresh entries are returned without any request. Once an entry's TTL has passed it is
+# revalidated with If-None-Match, so an unchanged resource costs a 304 with no body.
+# The cache is capped at max_cache_bytes, evicting least recently used entries first.
+# The total size is kept up to date on each write; the folder is only listed on the
+# first write and when the cap is exceeded.
+
+# Cache location; None uses CACHE_DIR from the environment (or .env), read when first needed
+cache_dir = None
+
+# Maximum total size of cached responses on disk
+max_cache_bytes = 50 * 1024 * 1024
+
+# Time to live in seconds per endpoint, first matching URL path pattern wins
+endpoint_ttls = [
+    (r'/genre/', 7 * 24 * 3600),
+    (r'/configuration', 7 * 24 * 3600),
+    (r'/keywords$', 7 * 24 * 3600),
+    (r'/trending/', 6 * 3600),
+    (r'/discover/', 6 * 3600),
+    (r'/images$', 24 * 3600),
+    (r'/lists/[^/]+/items$', 0),  # Trakt lists: always revalidated, so edits show up on the next run
+]
+default_ttl = 24 * 3600
+
+# Response headers kept with cached bodies (content type, Trakt pagination)
+cached_headers = (
+    'Content-Type',
+    'X-Pagination-Page',
+    'X-Pagination-Limit',
+    'X-Pagination-Page-Count',
+    'X-Pagination-Item-Count',
+)
+
+cache_lock = threading.Lock()
+cache_size = None  # Total bytes on disk, computed on first write
+
+
+def cache_key(url, params=None):
+    """
+    Builds the cache key for a URL: its query parameters (including language) are
+    merged with params and sorted, so equivalent URLs share one entry.
+    """
+    parts = urlsplit(url)
+    query = sorted(parse_qsl(parts.query, keep_blank_values=True) + list((params or {}).items()))
+    normalized = urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(query), ''))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def ttl_for(url):
+    """
+    Returns the time to live in seconds for a URL based on endpoint_ttls.
+    """
+    path = urlsplit(url).path
+    for pattern, ttl in endpoint_ttls:
+        if re.search(pattern, path):
+            return ttl
+    return default_ttl
+
+
+def get_cache_dir():
+    return cache_dir or os.path.join(os.getenv('CACHE_DIR') or 'cache', 'http')
+
+
+def entry_path(key):
+    return os.path.join(get_cache_dir(), f"{key}.json")
+
+
+def read_entry(key):
+    try:
+        with open(entry_path(key), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_entry(key, entry):
+    """
+    Writes an entry atomically (temp file + rename) so concurrent readers never see a partial file,
+    then evicts old entries if the cache is over its cap.
+    """
+    global cache_size
+    path = entry_path(key)
+    os.makedirs(get_cache_dir(), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=get_cache_dir(), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        entry_size = os.path.getsize(tmp_path)
+        replaced_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+
+    with cache_lock:
+        if cache_size is None:
+            cache_size = sum(size for _, size, _ in scan())
+        else:
+            cache_size += entry_size - replaced_size
+        if cache_size > max_cache_bytes:
+            evict()
+
+
+def touch(key):
+    """
+    Marks an entry as recently used for LRU eviction.
+    """
+    try:
+        os.utime(entry_path(key))
+    except OSError:
+        pass
+
+
+def scan():
+    """
+    Lists (last used time, size, path) for every cached entry.
+    """
+    try:
+        entries = [e for e in os.scandir(get_cache_dir()) if e.name.endswith('.json')]
+    except OSError:
+        return []
+    files = []
+    for e in entries:
+        try:
+            stat = e.stat()
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, e.path))
+    return files
+
+
+def evict():
+    """
+    Removes least recently used entries until the cache fits in max_cache_bytes.
+    Must be called with cache_lock held.
+    """
+    global cache_size
+    files = scan()
+    cache_size = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if cache_size <= max_cache_bytes:
+            break
+        try:
+            os.remove(path)
+            cache_size -= size
+        except OSError:
+            pass
+
+
+def cached_response(url, entry):
+    """
+    Builds a requests.Response from a cache entry so callers can use .status_code and .json() as usual.
+    """
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.encoding = 'utf-8'
+    response.headers = CaseInsensitiveDict(entry.get('headers', {}))
+    response._content = entry['body'].encode('utf-8')
+    return response
+
+
+def get(url, headers=None, params=None, ttl=None, **kwargs):
+    """
+    GETs a URL through the on-disk cache.
+
+    :param url: URL to fetch.
+    :param headers: Request headers (not part of the cache key).
+    :param params: Extra query parameters.
+    :param ttl: Time to live in seconds, defaults to the endpoint's entry in endpoint_ttls.
+    :return: requests.Response, either from the network or rebuilt from the cache.
+    """
+    key = cache_key(url, params)
+    ttl = ttl_for(url) if ttl is None else ttl
+    entry = read_entry(key)
+
+    if entry and time.time() - entry['fetched_at'] < ttl:
+        touch(key)
+        return cached_response(url, entry)
+
+    request_headers = dict(headers or {})
+    if entry and entry.get('etag'):
+        request_headers['If-None-Match'] = entry['etag']
+
+    response = session.get(url, headers=request_headers, params=params, **kwargs)
+
+    if response.status_code == 304 and entry:
+        # Unchanged on the server: keep the body and restart its TTL
+        entry['fetched_at'] = time.time()
+        write_entry(key, entry)
+        return cached_response(url, entry)
+
+    if response.status_code == 200:
+        write_entry(key, {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'fetched_at': time.time(),
+            'headers': {name: response.headers[name] for name in cached_headers if name in response.headers},
+            'body': response.content.decode('utf-8', errors='replace'),
+        })
+
+    return response
@@ -0,0 +1,88 @@
+# === Third-Party Imports ===
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# === Local Imports ===
+from ratelimit import RateLimitedSession, host_of
+
+# Shared HTTP client for all scripts.
+# One session keeps TCP/TLS connections alive between requests, so each host is only
+# connected to once per run. Requests without an explicit timeout get default_timeout,
+# and idempotent requests are retried with exponential backoff on 500/502/504 responses,
+# connection errors and resets. Rate limiting comes from ratelimit.RateLimitedSession.
+
+# (connect, read) timeout in seconds used when a call does not pass its own
+default_timeout = (5, 30)
+
+# Keep-alive connections kept open per host; hosts not listed use default_pool_size
+host_pool_sizes = {
+    'api.themoviedb.org': 10,
+    'image.tmdb.org': 10,
+    'api.trakt.tv': 4,
+}
+default_pool_size = 4
+
+# Retries for connection errors, resets and server errors, waiting 0.5s, 1s, 2s... between tries.
+# 429 and 503 are not retried here: they reach ratelimit.RateLimitedSession, which pauses the
+# whole host for the Retry-After instead of only the request that got the response.
+retry_policy = Retry(
+    total=3,
+    connect=3,
+    read=3,
+    status=3,
+    backoff_factor=0.5,
+    status_forcelist=(500, 502, 504),
+    allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+    respect_retry_after_header=False,
+    raise_on_status=False,
+)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that applies default_timeout to requests sent without a timeout.
+    """
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout or default_timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def make_adapter(pool_size):
+    """
+    Creates a retrying, timeout-enforcing adapter keeping up to pool_size connections per host.
+    """
+    return TimeoutHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry_policy)
+
+
+def mount_host(session, url, pool_size):
+    """
+    Gives a host its own connection pool size (e.g. a Plex server fetched from several threads).
+
+    :param session: Session to configure.
+    :param url: Any URL (or base URL) on the host.
+    :param pool_size: Keep-alive connections to keep open to the host.
+    """
+    scheme = url.split('://', 1)[0] if '://' in url else 'https'
+    session.mount(f"{scheme}://{host_of(url)}/", make_adapter(pool_size))
+
+
+def create_session():
+    """
+    Creates a rate-limited session with pooled keep-alive connections, retries and default timeouts.
+    """
+    session = RateLimitedSession()
+    session.mount('http://', make_adapter(default_pool_size))
+    session.mount('https://', make_adapter(default_pool_size))
+    for host, pool_size in host_pool_sizes.items():
+        mount_host(session, f"https://{host}", pool_size)
+    return session
+
+
+# Session shared by all requests made from a script
+session = create_session()
@@ -0,0 +1,135 @@
+# === Standard Library Imports ===
+import hashlib
+import os
+import tempfile
+import threading
+
+# === Local Imports ===
+from http_client import session
+
+# Local blob cache for downloaded backdrops and logos, shared by all scripts.
+# Images are stored as the encoded (JPEG/PNG) bytes the server sent, under a key that
+# changes whenever the image does: the TMDB file path, the Plex art path (which carries
+# its update timestamp) or a Jellyfin image tag. An unchanged image is then read from
+# disk instead of the CDN or media server. The cache is capped at max_cache_bytes,
+# evicting least recently used images first.
+
+# Cache location; None uses CACHE_DIR from the environment (or .env), read when first needed
+cache_dir = None
+
+# Maximum total size of cached images on disk
+max_cache_bytes = 1024 * 1024 * 1024
+
+cache_lock = threading.Lock()
+cache_size = None  # Total bytes on disk, computed on first store
+
+
+def get_cache_dir():
+    return cache_dir or os.path.join(os.getenv('CACHE_DIR') or 'cache', 'images')
+
+
+def blob_path(key):
+    """
+    Returns the file path for a cache key; files are spread over 256 subfolders.
+    """
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return os.path.join(get_cache_dir(), digest[:2], digest)
+
+
+def read(key):
+    """
+    Returns the cached bytes for a key (marking them recently used), or None.
+    """
+    path = blob_path(key)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.utime(path)
+        return data
+    except OSError:
+        return None
+
+
+def store(key, data):
+    """
+    Saves bytes under a key atomically, then evicts old images if the cache is over its cap.
+    """
+    global cache_size
+    path = blob_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # A key stored again (e.g. by two threads at once) replaces its file, not adds to the total
+        replaced_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+
+    with cache_lock:
+        if cache_size is None:
+            cache_size = sum(size for _, size, _ in scan())
+        else:
+            cache_size += len(data) - replaced_size
+        if cache_size > max_cache_bytes:
+            evict()
+
+
+def scan():
+    """
+    Lists (last used time, size, path) for every cached image.
+    """
+    files = []
+    for root, _, names in os.walk(get_cache_dir()):
+        for name in names:
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+
+def evict():
+    """
+    Removes least recently used images until the cache fits in max_cache_bytes.
+    Must be called with cache_lock held.
+    """
+    global cache_size
+    files = scan()
+    cache_size = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if cache_size <= max_cache_bytes:
+            break
+        try:
+            os.remove(path)
+            cache_size -= size
+        except OSError:
+            pass
+
+
+def fetch(url, key=None, **kwargs):
+    """
+    Returns the bytes of an image, from the cache when possible, otherwise downloaded and cached.
+
+    :param url: URL to download the image from.
+    :param key: Cache key identifying this exact image version (defaults to the URL).
+    :param kwargs: Extra arguments for the GET request (headers, timeout...).
+    :return: Encoded image bytes, or None if the download failed.
+    """
+    key = key or url
+    data = read(key)
+    if data is not None:
+        return data
+
+    response = session.get(url, **kwargs)
+    if response.status_code != 200:
+        return None
+    store(key, response.content)
+    return response.content
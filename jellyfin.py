@@ -1,25 +1,38 @@
-import requests
 import os
-import time
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 from io import BytesIO
 import unicodedata
 import re
-import shutil
 import textwrap
 
+import backdrops
+import encoder
+import fonts
+import image_cache
+import logos
+import ratelimit
+import render_manifest
+import template
+import text_layout
+from http_client import session
+
 # Jellyfin Server Configuration (Global Parameters)
 baseurl = 'http://XXX:XXX'
 token = 'XXX'
 user_id ="XXX"
 
+# Jellyfin request rate limit (sustained requests per second and burst); set the rate to None to disable
+jellyfin_max_requests_per_second = 5
+jellyfin_request_burst = 10
+ratelimit.set_rate(baseurl, jellyfin_max_requests_per_second, jellyfin_request_burst)
+
 # Save font locally
 truetype_url = 'https://github.com/googlefonts/roboto/raw/main/src/hinted/Roboto-Light.ttf'
 truetype_path = 'Roboto-Light.ttf'
 
 if not os.path.exists(truetype_path):
     try:
-        response = requests.get(truetype_url, timeout=10)
+        response = session.get(truetype_url, timeout=10)
         if response.status_code == 200:
             with open(truetype_path, 'wb') as f:
                 f.write(response.content)
@@ -29,6 +42,9 @@ if not os.path.exists(truetype_path):
     except Exception as e:
         print(f"An error occurred while downloading the Roboto-Light font: {e}")
 
+# Make sure the font can draw the labels before rendering anything
+fonts.check_coverage(truetype_path, text="Now Available on")
+
 # Set the order_by parameter to 'aired' or 'added'
 order_by = 'DateCreated' # 'DateCreated', 'DateLastContentAdded', 'PremiereDate'
 download_movies = True
@@ -38,17 +54,17 @@ excluded_genres = ['Horror', 'Thriller']
 excluded_tags = ['Adult', 'Violence']
 excluded_libraries = ['Web Videos']
 
-# Create a directory to save the backgrounds and clear its contents if it exists
+# Directory to save the backgrounds; unchanged backgrounds are kept between runs and
+# those of items no longer selected are removed at the end
 background_dir = "jellyfin_backgrounds"
-if os.path.exists(background_dir):
-    shutil.rmtree(background_dir)
-os.makedirs(background_dir, exist_ok=True)
+manifest = render_manifest.RenderManifest(background_dir)
 
+# Background, overlay and Jellyfin logo, composited once for all images
+background_template = template.get_template("jellyfinlogo.png", (680, 890))
+
+# Fingerprint of the template images, font and output settings shared by every background
+template_fingerprint = render_manifest.template_fingerprint("jellyfinlogo.png", truetype_path)
 
-def resize_image(image, height):
-    ratio = height / image.height
-    width = int(image.width * ratio)
-    return image.resize((width, height))
 
 def resize_logo(image, width, height):
     aspect_ratio = image.width / image.height
@@ -71,145 +87,192 @@ def clean_filename(filename):
 
 def download_logo_in_memory(media_item):
     logo_url = f"{baseurl}/Items/{media_item['Id']}/Images/Logo?api_key={token}"
+    # Ask Jellyfin to scale the logo to the 1300x400 box it is drawn in, keeping transparency
+    resized_url = f"{baseurl}/Items/{media_item['Id']}/Images/Logo?maxWidth=1300&maxHeight=400&format=Png&api_key={token}"
+    # Jellyfin image tags change whenever the image does, so they identify cached logos
+    logo_tag = media_item.get('ImageTags', {}).get('Logo')
+    logo_key = f"jellyfin:{baseurl}/Items/{media_item['Id']}/Images/Logo/{logo_tag}"
     
     try:
-        response = requests.get(logo_url, timeout=10)
-        if response.status_code == 200:
-            logo_image = Image.open(BytesIO(response.content))
+        logo_bytes = logos.fetch_logo(resized_url, logo_url, key=f"{logo_key}/1300x400", original_key=logo_key, timeout=10)
+        if logo_bytes:
+            logo_image = Image.open(BytesIO(logo_bytes))
             return logo_image  # Return the logo as a PIL Image object
         else:
-            print(f"Failed to retrieve logo for {media_item['Name']}. Status code: {response.status_code}")
+            print(f"Failed to retrieve logo for {media_item['Name']}.")
             return None
     except Exception as e:
         print(f"An error occurred while downloading the logo for {media_item['Name']}: {e}")
         return None
 
-def get_excluded_library_ids():
-    """Fetch library IDs based on excluded library names."""
+def build_info_text(item, media_type, seasons_count=None):
+    """Build the info line (year, genres, duration or seasons, rating) for a media item.
+
+    seasons_count is the number of seasons of a series, see get_seasons_count; the seasons are left out without it."""
+    if media_type == 'Movie':
+        if 'CommunityRating' in item:
+            rating_text = f" IMDb: {item['CommunityRating']:.1f}"
+        else:
+            rating_text = ""
+        duration_ticks = item['RunTimeTicks']
+        duration_minutes = duration_ticks // (10**7 * 60)
+        duration_text = f"{duration_minutes // 60}h{duration_minutes % 60}min"
+        return f"{item['PremiereDate'][:4]}  •  {', '.join(item['Genres'])}  •  {duration_text}  •  {rating_text}"
+
+    if 'CommunityRating' in item:
+        rating_text = f" IMDb: {item['CommunityRating']:.1f}"
+    else:
+        rating_text = ""
+    
+    if seasons_count is not None:
+        seasons_text = f"Season" if seasons_count == 1 else f"Seasons"
+        seasons_text = f"{seasons_count} {seasons_text} • " 
+    else:
+        seasons_text = ""
+    
+    return f"{item['PremiereDate'][:4]}  •  {', '.join(item['Genres'])}  •  {seasons_text}{rating_text}"
+
+def get_libraries():
+    """Fetch the libraries (virtual folders) of the server."""
     headers = {'X-Emby-Token': token}
-    response = requests.get(f"{baseurl}/Library/VirtualFolders", headers=headers)
+    response = session.get(f"{baseurl}/Library/VirtualFolders", headers=headers)
     
     if response.status_code == 200:
-        libraries = response.json()
-        # print(json.dumps(libraries,indent=4))
-        return {lib['ItemId'] for lib in libraries if lib['Name'] in excluded_libraries}
+        # print(json.dumps(response.json(),indent=4))
+        return response.json()
     else:
         print("Failed to retrieve library information.")
-        return set()
+        return []
+
+libraries = get_libraries()
+excluded_library_ids = {lib['ItemId'] for lib in libraries if lib['Name'] in excluded_libraries}
+
+# Library types that can hold each media type; mixed libraries have no CollectionType
+library_types = {'Movie': ('movies', 'mixed', None), 'Series': ('tvshows', 'mixed', None)}
+
+def get_library_id(media_type):
+    """Return the id of the only library that can hold media_type and isn't excluded, or None if there are several.
+
+    With a single library the query is limited to it with ParentId, so the server skips excluded libraries."""
+    library_ids = [
+        lib['ItemId'] for lib in libraries
+        if lib['Name'] not in excluded_libraries and lib.get('CollectionType') in library_types[media_type]
+    ]
+    return library_ids[0] if len(library_ids) == 1 else None
+
+def get_seasons_count(series_id):
+    """Count the seasons of a series, specials (season 0) excluded, or None if they can't be retrieved."""
+    headers = {'X-Emby-Token': token}
+    params = {'EnableImages': 'false', 'EnableUserData': 'false'}
+    response = session.get(f"{baseurl}/Shows/{series_id}/Seasons", headers=headers, params=params, timeout=10)
 
-excluded_library_ids = get_excluded_library_ids()
+    if response.status_code != 200:
+        print(f"Failed to retrieve seasons. Status code: {response.status_code}")
+        return None
+    return sum(
+        1 for season in response.json().get('Items', [])
+        if season.get('Type') == 'Season' and (season.get('IndexNumber') or 0) > 0
+    )
 
 def download_latest_media(order_by, limit, media_type):
     headers = {'X-Emby-Token': token}
+    # Fetch a few more items than needed per page, as some are filtered out below
+    page_size = max(limit * 2, 20)
     params = {
         'SortBy': order_by,
-        'Limit': limit,
+        'Limit': page_size,
         'IncludeItemTypes': media_type,
         'Recursive': 'true',
         'SortOrder': 'Descending',
-        'Fields': 'PrimaryImageAspectRatio,CanDelete,MediaSourceCount,Overview,Genres,RunTimeTicks,CommunityRating,PremiereDate,Tags',
+        'ImageTypes': 'Backdrop',  # Only items that have a backdrop to render
+        'EnableTotalRecordCount': 'false',
+        # ChildCount changes when a season is added, so series are only re-rendered (and their seasons counted) then
+        'Fields': 'PrimaryImageAspectRatio,CanDelete,MediaSourceCount,Overview,Genres,RunTimeTicks,CommunityRating,PremiereDate,Tags,ChildCount',
     }
-    response = requests.get(f"{baseurl}/Users/{user_id}/Items", headers=headers, params=params)
+    # Jellyfin can only include genres and tags, not exclude them, so those are filtered below
+    library_id = get_library_id(media_type)
+    if library_id:
+        params['ParentId'] = library_id
 
-    if response.status_code == 200:
-        media_items = response.json()['Items']
-    else:
-        print(f"Failed to retrieve media items. Status code: {response.status_code}")
-        return
-
-    # Filter out excluded genres, tags, and libraries
+    # Filter out excluded genres, tags, and libraries, paging until limit items remain
     filtered_items = []
+    start_index = 0
 
-    for item in media_items:
-        if any(genre in excluded_genres for genre in item.get('Genres', [])):
-            continue
-        if any(tag in excluded_tags for tag in item.get('Tags', [])):
-            continue
-        if item.get('ParentId') in excluded_library_ids:
-            continue
-        filtered_items.append(item)
+    while len(filtered_items) < limit:
+        params['StartIndex'] = start_index
+        response = session.get(f"{baseurl}/Users/{user_id}/Items", headers=headers, params=params)
+
+        if response.status_code == 200:
+            media_items = response.json()['Items']
+        else:
+            print(f"Failed to retrieve media items. Status code: {response.status_code}")
+            if not filtered_items:
+                return
+            break
+
+        for item in media_items:
+            if any(genre in excluded_genres for genre in item.get('Genres', [])):
+                continue
+            if any(tag in excluded_tags for tag in item.get('Tags', [])):
+                continue
+            if item.get('ParentId') in excluded_library_ids:
+                continue
+            filtered_items.append(item)
+            if len(filtered_items) == limit:
+                break
+
+        start_index += len(media_items)
+        if len(media_items) < page_size:
+            break
 
     # Process the sorted media
     for item in filtered_items:
         # Get the URL of the background image
         background_url = f"{baseurl}/Items/{item['Id']}/Images/Backdrop?api_key={token}"
+        backdrop_tag = (item.get('BackdropImageTags') or [None])[0]
+        background_key = f"jellyfin:{baseurl}/Items/{item['Id']}/Images/Backdrop/{backdrop_tag}"
 
         if background_url:
             try:
-                # Download the background image with a timeout of 10 seconds
-                response = requests.get(background_url, timeout=10)
-
-                if response.status_code == 200:
-                    filename_safe_title = unicodedata.normalize('NFKD', item['Name']).encode('ASCII', 'ignore').decode('utf-8')
-                    filename_safe_title = clean_filename(filename_safe_title)
-                    background_filename = os.path.join(background_dir, f"{filename_safe_title}_{item['ProductionYear']}.jpg")
-                    
-                    with open(background_filename, 'wb') as f:
-                        f.write(response.content)
-                    
-                    image = Image.open(background_filename)
-                    bckg = Image.open(os.path.join(os.path.dirname(__file__), "bckg.png"))
-                    
-                    # Resize the image to have a height of 1500 pixels
-                    image = resize_image(image, 1500)
-
-                    overlay = Image.open(os.path.join(os.path.dirname(__file__), "overlay.png"))
-                    jellyfinlogo = Image.open(os.path.join(os.path.dirname(__file__), "jellyfinlogo.png"))
+                filename_safe_title = unicodedata.normalize('NFKD', item['Name']).encode('ASCII', 'ignore').decode('utf-8')
+                filename_safe_title = clean_filename(filename_safe_title)
+                output_name = f"{filename_safe_title}_{item['ProductionYear']}{encoder.extension()}"
+                background_filename = os.path.join(background_dir, output_name)
+
+                # Keep the existing background if nothing it was made from has changed
+                fingerprint = render_manifest.fingerprint(
+                    item['Id'], backdrop_tag, item.get('ImageTags', {}).get('Logo'), item['Name'],
+                    build_info_text(item, media_type), item.get('ChildCount'), item['Overview'], template_fingerprint,
+                )
+                if manifest.is_current(output_name, fingerprint):
+                    print(f"Unchanged, keeping: {background_filename}")
+                    continue
+
+                # Seasons are counted with their own request, only for series that are rendered
+                seasons_count = get_seasons_count(item['Id']) if media_type == 'Series' else None
+                info_text = build_info_text(item, media_type, seasons_count)
+
+                # Download the background image with a timeout of 10 seconds (or read it from the image cache)
+                background_bytes = image_cache.fetch(background_url, key=background_key, timeout=10)
+
+                if background_bytes:
+                    # Decode the image straight from memory at a height of 1500 pixels; only the
+                    # finished background is written, atomically, by manifest.save
+                    image = backdrops.open_backdrop(background_bytes, 1500)
+
+                    # Paste the image onto the precomposited background, overlay and Jellyfin logo
+                    bckg = background_template.render(image, (1175, 0))
 
-                    bckg.paste(image, (1175, 0))
-                    bckg.paste(overlay, (1175, 0), overlay)
-                    bckg.paste(jellyfinlogo, (680, 890), jellyfinlogo)
-
-                    # Add text on top of the image with shadow effect
-                    draw = ImageDraw.Draw(bckg)
-                    
                     # Font Setup
-                    font_title = ImageFont.truetype(truetype_path, size=190)
-                    font_info = ImageFont.truetype(truetype_path, size=55)
-                    font_summary = ImageFont.truetype(truetype_path, size=50)
-                    font_metadata = ImageFont.truetype(truetype_path, size=50)
-                    font_custom = ImageFont.truetype(truetype_path, size=60)                 
+                    font_title = fonts.get_font(truetype_path, 190)
+                    font_info = fonts.get_font(truetype_path, 55)
+                    font_summary = fonts.get_font(truetype_path, 50)
+                    font_metadata = fonts.get_font(truetype_path, 50)
+                    font_custom = fonts.get_font(truetype_path, 60)                 
                     
                     title_text = f"{item['Name']}"
                     logo_image = download_logo_in_memory(item)
 
-                    if media_type == 'Movie':
-                        if 'CommunityRating' in item:
-                            rating_text = f" IMDb: {item['CommunityRating']:.1f}"
-                        else:
-                            rating_text = ""
-                        duration_ticks = item['RunTimeTicks']
-                        duration_minutes = duration_ticks // (10**7 * 60)
-                        duration_text = f"{duration_minutes // 60}h{duration_minutes % 60}min"
-                        info_text = f"{item['PremiereDate'][:4]}  •  {', '.join(item['Genres'])}  •  {duration_text}  •  {rating_text}"
-                    else:
-                        if 'CommunityRating' in item:
-                            rating_text = f" IMDb: {item['CommunityRating']:.1f}"
-                        else:
-                            rating_text = ""
-                        
-                        seasons_url = f"{baseurl}/Shows/{item['Id']}/Seasons?api_key={token}"
-                        response = requests.get(seasons_url, timeout=10)
-
-                        if response.status_code == 200:
-                            full_response_data = response.json()
-                            
-                            if 'Items' in full_response_data and isinstance(full_response_data['Items'], list):
-                                actual_seasons = [
-                                    s for s in full_response_data['Items'] 
-                                    if s.get('Type') == 'Season' and s.get('IndexNumber', 0) > 0
-                                ]
-                                
-                                seasons_count = len(actual_seasons)
-                                seasons_text = f"Season" if seasons_count == 1 else f"Seasons"
-                                seasons_text = f"{seasons_count} {seasons_text} • " 
-                            else:
-                                seasons_text = ""
-                        else:
-                            seasons_text = ""
-                        
-                        info_text = f"{item['PremiereDate'][:4]}  •  {', '.join(item['Genres'])}  •  {seasons_text}{rating_text}"
-
                     summary_text = truncate_summary(item['Overview'], 175)
                     custom_text = "Now Available on"
 
@@ -228,32 +291,28 @@ def download_latest_media(order_by, limit, media_type):
                     metadata_position = (210, 820)
                     custom_position = (210, 870)
 
-                    draw.text((info_position[0] + shadow_offset, info_position[1] + shadow_offset), info_text, font=font_info, fill=shadow_color)
-                    draw.text(info_position, info_text, font=font_info, fill=info_color)
-                    draw.text((summary_position[0] + shadow_offset, summary_position[1] + shadow_offset), wrapped_summary, font=font_summary, fill=shadow_color)
-                    draw.text(summary_position, wrapped_summary, font=font_summary, fill=summary_color)
-                    draw.text((custom_position[0] + shadow_offset, custom_position[1] + shadow_offset), custom_text, font=font_custom, fill=shadow_color)
-                    draw.text(custom_position, custom_text, font=font_custom, fill=metadata_color)
+                    # Each string is rasterized once; the shadow and the fill share its mask.
+                    # Only the custom label is the same on every background, so only its mask is cached
+                    shadow = (shadow_offset, shadow_offset)
+                    text_layout.draw_text_with_shadow(bckg, info_position, info_text, font_info, info_color, shadow_color, shadow)
+                    text_layout.draw_text_with_shadow(bckg, summary_position, wrapped_summary, font_summary, summary_color, shadow_color, shadow)
+                    text_layout.draw_text_with_shadow(bckg, custom_position, custom_text, font_custom, metadata_color, shadow_color, shadow, cache=True)
 
                     if logo_image:
                         logo_resized = resize_logo(logo_image, 1300, 400).convert('RGBA')
                         logo_position = (210, info_position[1] - logo_resized.height - 25)
                         bckg.paste(logo_resized, logo_position, logo_resized)
                     else:
-                        draw.text((title_position[0] + shadow_offset, title_position[1] + shadow_offset), truncate_summary(title_text,30), font=font_title, fill=shadow_color)
-                        draw.text(title_position, truncate_summary(title_text,30), font=font_title, fill=main_color)
+                        text_layout.draw_text_with_shadow(bckg, title_position, truncate_summary(title_text,30), font_title, main_color, shadow_color, shadow)
 
-                    bckg = bckg.convert('RGB')
-                    bckg.save(background_filename)
-                    print(f"Image saved: {background_filename}")
+                    saved_filename = manifest.save(bckg, output_name, fingerprint)
+                    print(f"Image saved: {saved_filename}")
 
                 else:
                     print(f"Failed to download background for {item['Name']}")
             except Exception as e:
                 print(f"An error occurred while processing {item['Name']}: {e}")
 
-        time.sleep(1)
-
 # Download the latest movies according to the specified order and limit
 if download_movies:
     download_latest_media(order_by, limit, 'Movie')
@@ -261,3 +320,6 @@ if download_movies:
 # Download the latest TV series according to the specified order and limit
 if download_series:
     download_latest_media(order_by, limit, 'Series')
+
+# Remove backgrounds of items that are no longer selected
+manifest.finish()
@@ -0,0 +1,75 @@
+# === Local Imports ===
+import image_cache
+
+# Logo ingestion shared by all scripts.
+# Logos are drawn inside a box of at most 1300x400 (Plex, Jellyfin) or 1000x500 (TMDB,
+# Trakt) pixels, while the original files are often several thousand pixels wide.
+# Each source is asked for a rendition close to the size the logo will be drawn at:
+# the Plex and Jellyfin image transcoders scale to the box, and TMDB serves the
+# smallest size bucket that covers the drawn width. TMDB's largest logo bucket is w500,
+# narrower than a 1000 pixel wide logo, so w500 is still used when it only needs to be
+# scaled up by tmdb_logo_max_upscale or less; the original (often several MB of PNG) is
+# only downloaded for wider logos or when the smaller rendition is not available.
+
+# TMDB logo widths from /configuration, smallest first; "original" is used when none is wide enough
+tmdb_logo_sizes = [('w92', 92), ('w154', 154), ('w185', 185), ('w300', 300), ('w500', 500)]
+
+# Largest scale-up of the widest bucket before the original is downloaded instead
+tmdb_logo_max_upscale = 2
+
+
+def fitted_width(aspect_ratio, max_width, max_height):
+    """
+    Returns the width of a logo with this aspect ratio once fitted into max_width x max_height.
+    """
+    if not aspect_ratio:
+        return max_width
+    return min(max_width, int(max_height * aspect_ratio))
+
+
+def tmdb_logo_url(file_path, width):
+    """
+    Returns the URL of the smallest TMDB rendition of a logo that is at least width pixels wide,
+    or of the widest one if it is at most tmdb_logo_max_upscale times narrower.
+    """
+    size = next((name for name, size_width in tmdb_logo_sizes if size_width >= width), None)
+    if size is None:
+        name, size_width = tmdb_logo_sizes[-1]
+        size = name if size_width * tmdb_logo_max_upscale >= width else 'original'
+    return f"https://image.tmdb.org/t/p/{size}{file_path}"
+
+
+def fetch_logo(url, original_url, key=None, original_key=None, **kwargs):
+    """
+    Returns the bytes of a resized logo, falling back to the original file if the
+    resized rendition can't be downloaded.
+
+    :param url: URL of the resized rendition.
+    :param original_url: URL of the original logo.
+    :param key: Image cache key of the resized rendition (defaults to its URL).
+    :param original_key: Image cache key of the original (defaults to its URL).
+    :param kwargs: Extra arguments for the GET requests (timeout...).
+    :return: Encoded logo bytes, or None if neither could be downloaded.
+    """
+    logo_bytes = image_cache.fetch(url, key=key, **kwargs)
+    if logo_bytes is None and original_url != url:
+        logo_bytes = image_cache.fetch(original_url, key=original_key, **kwargs)
+    return logo_bytes
+
+
+def fetch_tmdb_logo(logo, max_width, max_height, **kwargs):
+    """
+    Downloads a TMDB logo at the smallest size bucket that fills the logo box, or at w500
+    when that is at most tmdb_logo_max_upscale times too narrow.
+
+    :param logo: Logo entry from the TMDB images endpoint (file_path, aspect_ratio...).
+    :param max_width: Width of the box the logo is drawn in.
+    :param max_height: Height of the box the logo is drawn in.
+    :return: Encoded logo bytes, or None if the logo could not be downloaded.
+    """
+    width = fitted_width(logo.get('aspect_ratio'), max_width, max_height)
+    return fetch_logo(
+        tmdb_logo_url(logo['file_path'], width),
+        f"https://image.tmdb.org/t/p/original{logo['file_path']}",
+        **kwargs
+    )
@@ -1,19 +1,35 @@
 # === Standard Library Imports ===
 import os
-import time
 import math
+import multiprocessing
 import random
-import shutil
 import textwrap
+import threading
 import unicodedata
 from io import BytesIO
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from urllib.parse import quote
 from urllib.request import urlopen
 
 # === Third-Party Imports ===
 import requests
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 from plexapi.server import PlexServer
 
+# === Local Imports ===
+import backdrops
+import encoder
+import fonts
+import http_client
+import image_cache
+import logos
+import ratelimit
+import render_manifest
+import template
+import text_layout
+import variants
+from http_client import session
+
 # === User Configurable Options ===
 
 # NOTE: It's recommended to load these from environment variables
@@ -73,18 +89,24 @@ metadata_color  = "white"             # Metadata text color (e.g., year, genre)
 # Shadow styling
 shadow_color    = "black"             # Shadow color behind text
 shadow_offset   = 2                   # Shadow offset in pixels (x and y direction)
+shadow_blur     = 0                   # Shadow blur radius in pixels (0 = hard shadow)
+
+# Plex request rate limit, shared by all download threads, to reduce Plex server load
+plex_max_requests_per_second = 5  # Sustained rate; set to None to disable, lower it if Plex is struggling to keep up
+plex_request_burst = 10           # Requests allowed back to back before the sustained rate applies
 
-# Seconds to sleep between processing each media item to reduce Plex server load
-plex_api_delay_seconds = 1.0  # Default 1 second; adjust as needed if Plex is struggling to keep up
+# Pipeline concurrency
+fetch_workers = 4          # Threads downloading art and logos from Plex at the same time
+render_workers = None      # Processes compositing and encoding images (None = one per CPU core)
+render_queue_per_worker = 2  # Fetched items waiting for or in rendering, per render process; bounds memory held by downloaded art
 
 # === Script Initialization ===
 # NOTE: This section and those below are for internal script use only.
 # User configurable options are above this point.
 
-# Create a directory to save the backgrounds and clear its contents
+# Directory to save the backgrounds; unchanged backgrounds are kept between runs and
+# those of items no longer selected are removed (see render_manifest)
 background_dir = "plex_backgrounds"
-if os.path.exists(background_dir):
-    shutil.rmtree(background_dir)
 os.makedirs(background_dir, exist_ok=True)
 
 # If baseurl or token are not hardcoded, then load from environment variables
@@ -99,9 +121,19 @@ if not baseurl or baseurl.strip() == '' or not token or token.strip() == '':
     print("2. Set BASEURL and TOKEN as environment variables in the .env file.")
     exit(1)
 
+# All requests to the Plex server share one token bucket
+ratelimit.set_rate(baseurl, plex_max_requests_per_second, plex_request_burst)
+
+# Keep enough keep-alive connections to the Plex server for every fetch thread
+http_client.mount_host(session, baseurl, max(fetch_workers, http_client.default_pool_size))
+
 # Initialize the PlexServer instance globally
 plex_instance = None
 
+# Static template images, set in each render worker by init_render_worker
+render_template = None
+render_plex_logo = None
+
 # Set the truetype_path based on successful download
 truetype_path = None
 
@@ -116,6 +148,10 @@ additional_fallback_fonts = [
     {'url': 'https://github.com/googlefonts/poppins/raw/main/fonts/ttf/Poppins-Light.ttf', 'path': 'Poppins-Light.ttf'}
 ]
 
+# Box the clearLogo is drawn in; Plex's photo transcoder scales logos to it before download
+logo_max_width = 1300
+logo_max_height = 400
+
 # Map plex logo variant to filename
 logo_filenames = {
     "color": "plexlogo_color.png",
@@ -133,7 +169,7 @@ def download_font(url, path):
     """
     try:
         if not os.path.exists(path):
-            response = requests.get(url, timeout=10)
+            response = session.get(url, timeout=10)
             if response.status_code == 200:
                 with open(path, 'wb') as f:
                     f.write(response.content)
@@ -155,7 +191,7 @@ def initialize_plex_connection():
     """
     global plex_instance  # Access the global plex_instance variable
     if plex_instance is None:  # Ensure we only initialize once
-        plex_instance = PlexServer(baseurl, token)
+        plex_instance = PlexServer(baseurl, token, session=session)
         try:
             plex_version = plex_instance.version
             debug and print(f"[DEBUG] Connected to Plex Server: {plex_version}")
@@ -192,17 +228,16 @@ def validate_shadow_offset(offset, default):
     except (ValueError, TypeError):
         return default
 
-def resize_image(image: Image.Image, target_height: int) -> Image.Image:
+def validate_shadow_blur(radius, default):
     """
-    Resizes an image to a specific height while maintaining aspect ratio.
-
-    :param image: PIL Image object.
-    :param target_height: Desired height in pixels.
-    :return: Resized image.
+    Validate shadow blur radius.
+    Must be a number, zero or positive.
     """
-    ratio = target_height / image.height
-    target_width = int(image.width * ratio)
-    return image.resize((target_width, target_height))
+    try:
+        radius = float(radius)
+    except (ValueError, TypeError):
+        return default
+    return radius if radius >= 0 else default
 
 def resize_logo(image: Image.Image, max_width: int, max_height: int) -> Image.Image:
     """
@@ -241,60 +276,33 @@ def truncate_summary(summary: str, max_chars: int) -> tuple[str, bool]:
         # If no space to fit anything (e.g. max_chars < len(placeholder))
         return "...", True
 
-def draw_text_with_shadow(draw, position, text, font, fill_color, shadow_color, shadow_offset=(2,2)):
+def draw_text_with_shadow(image, position, text, font, fill_color, shadow_color, shadow_offset=(2,2), cache=False):
     """
     Draws text with a shadow effect on an image or canvas.
 
     The shadow is rendered first with an offset, followed by the main text on top of it.
     The shadow creates a visual effect of depth, making the text stand out.
+    The text is rasterized once and both layers are painted through the same mask;
+    set cache for labels, which every background repeats, to keep their mask.
     """
-    # Unpack the x and y coordinates from the provided position tuple
-    x, y = position
-    # The shadow is drawn slightly offset from the main text using the shadow_offset parameter (default is (2, 2))
-    draw.text((x + shadow_offset[0], y + shadow_offset[1]), text, font=font, fill=shadow_color)
-    # The main text is drawn on top of the shadow at the original position (x, y)
-    draw.text((x, y), text, font=font, fill=fill_color)
+    text_layout.draw_text_with_shadow(
+        image, position, text, font, fill_color, shadow_color,
+        shadow_offset=shadow_offset, shadow_blur=shadow_blur, cache=cache
+    )
 
-def wrap_text_by_pixel_width(text, font, max_width, draw):
+def wrap_text_by_pixel_width(text, font, max_width, draw=None):
     """
-    Wraps text to fit within a pixel width using the specified font and draw context.
+    Wraps text to fit within a pixel width using the specified font.
+
+    Word widths come from the shared text_layout cache, so a word is measured once per font.
 
     :param text: The input text to wrap.
     :param font: PIL ImageFont object.
     :param max_width: Maximum width in pixels.
-    :param draw: PIL ImageDraw.Draw object (needed for textbbox).
+    :param draw: Unused, kept for existing callers.
     :return: List of lines.
     """
-    words = text.split()
-    lines = []
-    current_line = ""
-
-    for word in words:
-        test_line = f"{current_line} {word}".strip()
-        line_width = draw.textlength(test_line, font=font)
-
-        if line_width <= max_width:
-            current_line = test_line
-        else:
-            if current_line:  # if line isn't empty, push it
-                lines.append(current_line)
-            # If word alone is longer than max width, forcibly split it
-            if draw.textlength(word, font=font) > max_width:
-                split_word = ""
-                for char in word:
-                    if draw.textlength(split_word + char, font=font) <= max_width:
-                        split_word += char
-                    else:
-                        lines.append(split_word)
-                        split_word = char
-                current_line = split_word
-            else:
-                current_line = word
-
-    if current_line:
-        lines.append(current_line)
-
-    return lines
+    return text_layout.wrap_text(text, font, max_width)
 
 def clean_filename(filename: str) -> str:
     """
@@ -305,275 +313,451 @@ def clean_filename(filename: str) -> str:
     """
     return "".join(c if c.isalnum() or c in "._-" else "_" for c in filename)
 
-def download_logo_in_memory(media_item) -> Image.Image or None:
+def download_logo_bytes(media_item) -> bytes or None:
     """
-    Attempts to download the Plex clearLogo image for a media item directly into memory.
+    Attempts to download the raw Plex clearLogo image bytes for a media item, scaled
+    by the Plex photo transcoder to the box it is drawn in. The original clearLogo is
+    downloaded if the transcoder can't provide it.
 
     :param media_item: Plex media object.
-    :return: PIL Image object of logo, or None if unavailable.
+    :return: Encoded logo bytes, or None if unavailable.
     """
-    logo_url = f"{baseurl}/library/metadata/{media_item.ratingKey}/clearLogo?X-Plex-Token={token}"
+    logo_path = f"/library/metadata/{media_item.ratingKey}/clearLogo"
+    logo_url = f"{baseurl}{logo_path}?X-Plex-Token={token}"
+    transcode_url = (
+        f"{baseurl}/photo/:/transcode?url={quote(logo_path, safe='')}"
+        f"&width={logo_max_width}&height={logo_max_height}&minSize=0&upscale=0&format=png"
+        f"&X-Plex-Token={token}"
+    )
+    logo_key = logo_cache_key(media_item)
 
     try:
-        response = requests.get(logo_url, timeout=10)
-        if response.status_code == 200:
-            return Image.open(BytesIO(response.content))
+        logo_bytes = logos.fetch_logo(
+            transcode_url, logo_url,
+            key=f"{logo_key}/{logo_max_width}x{logo_max_height}", original_key=logo_key,
+            timeout=10
+        )
+        if logo_bytes:
+            return logo_bytes
         else:
-            debug and print(f"Failed to retrieve logo for {media_item.title}. Status: {response.status_code}")
+            debug and print(f"Failed to retrieve logo for {media_item.title}.")
     except Exception as e:
         debug and print(f"Exception downloading logo for {media_item.title}: {e}")
 
     return None
 
-def generate_background_for_item(item, media_type, group_type='',
-                                 base_background=None, overlay=None,
-                                 plex_logo=None, target_folder=None):
+def build_info_text(item, media_type):
     """
-    Generates a customized background image for a given Plex media item (movie or show).
-    Downloads the art directly into memory, applies overlays, adds metadata text, and saves the final image.
+    Builds the '  •  ' separated info line (year, genres, duration/seasons, ratings) for a media item.
 
     :param item: Plex media item (movie or show).
     :param media_type: 'movie' or 'tv'.
-    :param group_type: Category label like 'aired', 'added', or 'random' (for custom text).
-    :param base_background: Preloaded background base image.
-    :param overlay: Preloaded overlay image.
-    :param plex_logo: Preloaded Plex logo image.
-    :param target_folder: Folder to save the background image to (defaults to current background_dir).
+    :return: Info text string.
     """
-    if base_background is None or overlay is None or plex_logo is None:
-        print(f"[ERROR] Background images were not provided to generate_background_for_item function")
+    max_genres = 3
+    genres_list = [genre.tag for genre in item.genres][:max_genres]
+    genres_text = ', '.join(genres_list)
+    rating = getattr(item, "audienceRating", None) or getattr(item, "rating", None) or ""
 
-    if target_folder is None:
-        target_folder = background_dir  # fallback to existing global background dir
+    if media_type == 'movie':
+        rating_text = f" IMDb: {rating}" if rating else ""
+        duration = getattr(item, "duration", None)
+        if duration:
+            duration_hours = duration // (60 * 60 * 1000)
+            duration_minutes = (duration // (60 * 1000)) % 60
+            duration_text = f"{duration_hours}h {duration_minutes}min"
+        else:
+            duration_text = ""
+        contentrating = getattr(item, "contentRating", "")
+        contentrating_text = f" {contentrating}" if contentrating else ""
 
-    # Normalize the path to remove trailing slashes/backslashes
-    target_folder = os.path.normpath(target_folder)
+        info_parts = [str(item.year)]
 
-    # Ensure the target folder exists
-    os.makedirs(target_folder, exist_ok=True)
+        if genres_text:
+            info_parts.append(genres_text)
 
-    background_url = item.artUrl
-    if not background_url:
-        debug and print(f"No background art URL for {item.title}")
-        return
+        if duration_text:
+            info_parts.append(duration_text)
 
-    try:
-        # Download the background image from Plex
-        response = requests.get(background_url, timeout=10)
-        response.raise_for_status()
+        if contentrating_text:
+            info_parts.append(contentrating_text)
 
-        # Load image directly from bytes into memory
-        image = Image.open(BytesIO(response.content))
+        if rating_text:
+            info_parts.append(rating_text)
+    else:
+        rating_text = f"IMDb: {rating}" if rating else ""
+        contentrating = getattr(item, "contentRating", None) or ""
+        contentrating_text = contentrating if contentrating else ""
+        # childCount (the show's season folders) comes with the listing; seasons() costs a request
+        seasons_count = getattr(item, "childCount", None)
+        if seasons_count is None:
+            seasons_count = len(getattr(item, "seasons", lambda: [])())
+        seasons_text = f"{seasons_count} Season" if seasons_count == 1 else f"{seasons_count} Seasons" if seasons_count else ""
 
-        # Safe filename
-        filename_safe_title = unicodedata.normalize('NFKD', item.title).encode('ASCII', 'ignore').decode('utf-8')
-        filename_safe_title = clean_filename(filename_safe_title)
+        info_parts = [str(item.year)]
 
-        # Save into target_folder instead of background_dir
-        background_filename = os.path.join(target_folder, f"{filename_safe_title}.jpg")
+        if genres_text:
+            info_parts.append(genres_text)
 
-        # Make copies of cached base background and overlay
-        canvas = base_background.copy()
-        overlay_copy = overlay.copy()
+        if seasons_text:
+            info_parts.append(seasons_text)
 
-        # Resize background image to height=1500
-        image = resize_image(image, 1500)
+        if contentrating_text:
+            info_parts.append(contentrating_text)
 
-        # Paste artwork and overlay on top
-        canvas.paste(image, (1175, 0))
-        canvas.paste(overlay_copy, (1175, 0), overlay_copy)
+        if rating_text:
+            info_parts.append(rating_text)
 
-        # Prepare to draw
-        draw = ImageDraw.Draw(canvas)
+    return "  •  ".join(info_parts)
 
-        # Load fonts
-        try:
-            font_title = ImageFont.truetype(truetype_path, size=190)
-            font_info = ImageFont.truetype(truetype_path, size=55)
-            font_summary = ImageFont.truetype(truetype_path, size=50)
-            font_custom = ImageFont.truetype(truetype_path, size=60)
-        except (OSError, IOError) as e:
-            print(f"[ERROR] Stopped background generation. Failed to load font from '{truetype_path}': {e}")
-            return  # Exit the function early; image generation cannot proceed without fonts
-
-        # Info text
-        if media_type == 'movie':
-            max_genres = 3
-            genres_list = [genre.tag for genre in item.genres][:max_genres]
-            genres_text = ', '.join(genres_list)
-            rating = getattr(item, "audienceRating", None) or getattr(item, "rating", None) or ""
-            rating_text = f" IMDb: {rating}" if rating else ""
-            duration = getattr(item, "duration", None)
-            if duration:
-                duration_hours = duration // (60 * 60 * 1000)
-                duration_minutes = (duration // (60 * 1000)) % 60
-                duration_text = f"{duration_hours}h {duration_minutes}min"
-            else:
-                duration_text = ""
-            contentrating = getattr(item, "contentRating", "")
-            contentrating_text = f" {contentrating}" if contentrating else ""
+def get_template_fingerprint():
+    """
+    Returns a fingerprint of everything shared by all renders: template images, font, style and output settings.
+    """
+    return render_manifest.template_fingerprint(
+        plex_logo_file, truetype_path,
+        main_color, info_color, summary_color, metadata_color, shadow_color, shadow_offset, shadow_blur,
+        plex_logo_horizontal_offset, plex_logo_vertical_offset, max_summary_chars, max_summary_width,
+    )
 
-            info_parts = [str(item.year)]
+def logo_cache_key(media_item):
+    """
+    Returns the image cache key of a media item's clearLogo. The clearLogo URL has no
+    version, so the item's update time tells cached logos apart.
+    """
+    updated_at = media_item.updatedAt.timestamp() if media_item.updatedAt else 0
+    return f"plex:{ratelimit.host_of(baseurl)}/library/metadata/{media_item.ratingKey}/clearLogo/{int(updated_at)}"
 
-            if genres_text:
-                info_parts.append(genres_text)
+def fetch_item_assets(item, media_type, group_type='', manifest=None, template_fingerprint=None):
+    """
+    Fetch stage: downloads the art and clearLogo of a media item and collects its text.
+    Runs in the fetch thread pool, so it only does network I/O and light string work.
 
-            if duration_text:
-                info_parts.append(duration_text)
+    If the manifest shows the item's existing background was made from the same inputs,
+    nothing is downloaded and the background is kept. The fingerprint only uses fields
+    that came with the item listing, so an unchanged item costs no request at all.
 
-            if contentrating_text:
-                info_parts.append(contentrating_text)
+    :param item: Plex media item (movie or show).
+    :param media_type: 'movie' or 'tv'.
+    :param group_type: Category label like 'aired', 'added', or 'random' (for custom text).
+    :param manifest: RenderManifest of the target folder, or None to always render.
+    :param template_fingerprint: get_template_fingerprint(), computed once per batch by the caller.
+    :return: Dict of picklable render inputs, or None if the item can't or needn't be rendered.
+    """
+    background_url = item.artUrl
+    if not background_url:
+        debug and print(f"No background art URL for {item.title}")
+        return None
 
-            if rating_text:
-                info_parts.append(rating_text)
+    try:
+        # Safe filename
+        filename_safe_title = unicodedata.normalize('NFKD', item.title).encode('ASCII', 'ignore').decode('utf-8')
+        filename_safe_title = clean_filename(filename_safe_title)
 
-            info_text = "  •  ".join(info_parts)
+        # Custom label text, uses the user-defined custom text options
+        if group_type == 'added':
+            custom_text = added_label
+        elif group_type == 'aired':
+            custom_text = aired_label
+        elif group_type == 'random':
+            custom_text = random_label
         else:
-            max_genres = 3
-            genres_list = [genre.tag for genre in item.genres][:max_genres]
-            genres_text = ', '.join(genres_list)
-            rating = getattr(item, "audienceRating", None) or getattr(item, "rating", None) or ""
-            rating_text = f"IMDb: {rating}" if rating else ""
-            contentrating = getattr(item, "contentRating", None) or ""
-            contentrating_text = contentrating if contentrating else ""
-            seasons = getattr(item, "seasons", lambda: [])()
-            seasons_count = len(seasons)
-            seasons_text = f"{seasons_count} Season" if seasons_count == 1 else f"{seasons_count} Seasons" if seasons_count else ""
+            custom_text = default_label
 
-            info_parts = [str(item.year)]
+        filename = f"{filename_safe_title}{encoder.extension()}"
+        info_text = build_info_text(item, media_type)
+        art_key = f"plex:{ratelimit.host_of(baseurl)}{item.art}"
 
-            if genres_text:
-                info_parts.append(genres_text)
+        # Skip items whose inputs are unchanged since their background was rendered
+        fingerprint = render_manifest.fingerprint(
+            item.ratingKey, art_key, logo_cache_key(item), item.title, info_text,
+            item.summary, custom_text, template_fingerprint or get_template_fingerprint(),
+        )
+        if manifest is not None and manifest.is_current(filename, fingerprint):
+            print(f"Unchanged, keeping: {os.path.join(manifest.output_dir, filename)}")
+            return None
+
+        # Download the background image from Plex, or reuse it if this art version is cached
+        art_bytes = image_cache.fetch(background_url, key=art_key, timeout=10)
+        if art_bytes is None:
+            print(f"Failed to download background for {item.title}")
+            return None
+
+        return {
+            'title': item.title,
+            'filename': filename,
+            'fingerprint': fingerprint,
+            'art_bytes': art_bytes,
+            'logo_bytes': download_logo_bytes(item),
+            'info_text': info_text,
+            'summary': item.summary,
+            'custom_text': custom_text,
+            'encoder_settings': encoder.get_settings(),
+            'sizes': variants.get_sizes(),
+        }
 
-            if seasons_text:
-                info_parts.append(seasons_text)
+    except requests.exceptions.RequestException as e:
+        print(f"Error downloading background for {item.title}: {e}")
+    except Exception as e:
+        print(f"An error occurred while processing {item.title}: {e}")
+    return None
 
-            if contentrating_text:
-                info_parts.append(contentrating_text)
+def init_render_worker(background_template, plex_logo):
+    """
+    Process pool initializer: keeps the static template images in each render worker
+    so they are sent once per worker instead of once per item.
+    """
+    global render_template, render_plex_logo
+    render_template = background_template
+    render_plex_logo = plex_logo
 
-            if rating_text:
-                info_parts.append(rating_text)
+def render_background(assets, background_template=None, plex_logo=None):
+    """
+    Render stage: composites the art, overlay, logos and text once, and encodes the image
+    at every output size with the output settings chosen in the main process.
+    CPU-bound, runs in the render process pool.
+
+    :param assets: Dict returned by fetch_item_assets.
+    :param background_template: Precomposited template.Template (defaults to the worker's preloaded one).
+    :param plex_logo: Plex logo image (defaults to the worker's preloaded one).
+    :return: Tuple of (filename, dict of size subfolder to encoded bytes, fingerprint).
+    """
+    background_template = background_template or render_template
+    plex_logo = plex_logo or render_plex_logo
 
-            info_text = "  •  ".join(info_parts)
+    # Decode the background image straight at height=1500
+    image = backdrops.open_backdrop(assets['art_bytes'], 1500)
 
-        # Summary text
+    # Copy the precomposited base with the artwork and overlay on top
+    canvas = background_template.render(image, (1175, 0))
 
-        # Use default max length for summary if not explicitly set
-        summary_max_chars = max_summary_chars if max_summary_chars is not None else 525
+    # Fonts are loaded once per process and shared by every background
+    font_title = fonts.get_font(truetype_path, 190)
+    font_info = fonts.get_font(truetype_path, 55)
+    font_summary = fonts.get_font(truetype_path, 50)
+    font_custom = fonts.get_font(truetype_path, 60)
 
-        # Use default max width if not explicitly set
-        summary_pixel_width = max_summary_width if max_summary_width is not None else 2100
+    # Summary text
 
-        # Truncate and wrap summary text
-        summary_text, was_truncated = truncate_summary(item.summary, summary_max_chars)
-        wrapped_summary_lines = wrap_text_by_pixel_width(
-            summary_text,
-            font_summary,
-            max_width=summary_pixel_width,
-            draw=draw
-        )
-        # Adds a newline between each summary line, may not be enough for fonts
-        # with fancy flourishes but should work most of the time. Can improve this
-        # logic if it causes issues with line overlap to allow for a custom line spacing
-        wrapped_summary = "\n".join(wrapped_summary_lines)
+    # Use default max length for summary if not explicitly set
+    summary_max_chars = max_summary_chars if max_summary_chars is not None else 525
 
-        # Custom label text, uses the user-defined custom text options
-        if group_type == 'added':
-            custom_text = added_label
-        elif group_type == 'aired':
-            custom_text = aired_label
-        elif group_type == 'random':
-            custom_text = random_label
-        else:
-            custom_text = default_label
+    # Use default max width if not explicitly set
+    summary_pixel_width = max_summary_width if max_summary_width is not None else 2100
 
-        # Info text
-        info_position = (210, 650)
-        draw_text_with_shadow(
-            draw,
-            info_position,
-            info_text,
-            font_info,
-            fill_color=info_color,
-            shadow_color=shadow_color,
-            shadow_offset=(shadow_offset, shadow_offset)
+    # Truncate and wrap summary text
+    summary_text, was_truncated = truncate_summary(assets['summary'], summary_max_chars)
+    wrapped_summary_lines = wrap_text_by_pixel_width(
+        summary_text,
+        font_summary,
+        max_width=summary_pixel_width
+    )
+    # Adds a newline between each summary line, may not be enough for fonts
+    # with fancy flourishes but should work most of the time. Can improve this
+    # logic if it causes issues with line overlap to allow for a custom line spacing
+    wrapped_summary = "\n".join(wrapped_summary_lines)
+
+    custom_text = assets['custom_text']
+
+    # Info text
+    info_position = (210, 650)
+    draw_text_with_shadow(
+        canvas,
+        info_position,
+        assets['info_text'],
+        font_info,
+        fill_color=info_color,
+        shadow_color=shadow_color,
+        shadow_offset=(shadow_offset, shadow_offset)
 )
-        # Summary block
-        summary_position = (210, 730)
-        draw_text_with_shadow(
-            draw,
-            summary_position,
-            wrapped_summary,
-            font_summary,
-            fill_color=summary_color,
-            shadow_color=shadow_color,
-            shadow_offset=(shadow_offset, shadow_offset)
+    # Summary block
+    summary_position = (210, 730)
+    draw_text_with_shadow(
+        canvas,
+        summary_position,
+        wrapped_summary,
+        font_summary,
+        fill_color=summary_color,
+        shadow_color=shadow_color,
+        shadow_offset=(shadow_offset, shadow_offset)
 )
 
-        # Custom label and attempt at Plex logo positioning
-        draw_bbox = draw.textbbox((0, 0), custom_text, font=font_custom)
-        text_width = draw_bbox[2] - draw_bbox[0]
-        summary_bbox = draw.textbbox((0, 0), wrapped_summary, font=font_summary)
-        summary_block_height = summary_bbox[3] - summary_bbox[1]
-        custom_x = 210
-        custom_y = summary_position[1] + summary_block_height + 30
-        custom_ascent, custom_descent = font_custom.getmetrics()
-        text_height = custom_ascent + custom_descent
-
-        logo_width, logo_height = plex_logo.size
-        padding = 20
-        logo_x = custom_x + text_width + padding + plex_logo_horizontal_offset
-        logo_y = custom_y + (text_height - logo_height) // 2 + plex_logo_vertical_offset
+    # Custom label and attempt at Plex logo positioning
+    draw_bbox = text_layout.text_bbox(font_custom, custom_text)
+    text_width = draw_bbox[2] - draw_bbox[0]
+    summary_block_height = text_layout.block_height(font_summary, wrapped_summary_lines)
+    custom_x = 210
+    custom_y = summary_position[1] + summary_block_height + 30
+    custom_ascent, custom_descent = font_custom.getmetrics()
+    text_height = custom_ascent + custom_descent
+
+    logo_width, logo_height = plex_logo.size
+    padding = 20
+    logo_x = custom_x + text_width + padding + plex_logo_horizontal_offset
+    logo_y = custom_y + (text_height - logo_height) // 2 + plex_logo_vertical_offset
+
+    draw_text_with_shadow(
+        canvas,
+        (custom_x, custom_y),
+        custom_text,
+        font_custom,
+        fill_color=metadata_color,
+        shadow_color=shadow_color,
+        shadow_offset=(shadow_offset, shadow_offset),
+        cache=True
+    )
 
+    # Paste Plex Logo
+    canvas.paste(plex_logo, (logo_x, logo_y), plex_logo)
+
+    # Logo or fallback title
+    logo_image = Image.open(BytesIO(assets['logo_bytes'])) if assets['logo_bytes'] else None
+    if logo_image:
+        logo_resized = resize_logo(logo_image, logo_max_width, logo_max_height).convert('RGBA')
+        logo_position = (210, info_position[1] - logo_resized.height - 25)
+        canvas.paste(logo_resized, logo_position, logo_resized)
+    else:
+        title_position = (200, 420)
+        title_text, _ = truncate_summary(assets['title'], 30)
         draw_text_with_shadow(
-            draw,
-            (custom_x, custom_y),
-            custom_text,
-            font_custom,
-            fill_color=metadata_color,
+            canvas,
+            title_position,
+            title_text,
+            font_title,
+            fill_color=main_color,
             shadow_color=shadow_color,
             shadow_offset=(shadow_offset, shadow_offset)
         )
 
-        # Paste Plex Logo
-        canvas.paste(plex_logo, (logo_x, logo_y), plex_logo)
+    # Encode final image; the canvas is already RGB
+    outputs = variants.encode(canvas, assets['sizes'], assets['encoder_settings'])
+    return assets['filename'], outputs, assets['fingerprint']
 
-        # Logo or fallback title
-        logo_image = download_logo_in_memory(item)
-        if logo_image:
-            logo_resized = resize_logo(logo_image, 1300, 400).convert('RGBA')
-            logo_position = (210, info_position[1] - logo_resized.height - 25)
-            canvas.paste(logo_resized, logo_position, logo_resized)
-        else:
-            title_position = (200, 420)
-            title_text, _ = truncate_summary(item.title, 30)
-            draw_text_with_shadow(
-                draw,
-                title_position,
-                title_text,
-                font_title,
-                fill_color=main_color,
-                shadow_color=shadow_color,
-                shadow_offset=(shadow_offset, shadow_offset)
-            )
+def write_background(rendered, target_folder, manifest=None):
+    """
+    Writer stage: atomically saves an encoded background into the target folder, or
+    into its size subfolders when several output sizes are configured.
 
-        # Save final image
-        canvas = canvas.convert('RGB')
-        canvas.save(background_filename)
-        print(f"Image saved: {background_filename}")
+    :param rendered: Tuple of (filename, encoded outputs, fingerprint) from render_background.
+    :param target_folder: Folder to save the background image to.
+    :param manifest: RenderManifest of the target folder to record the fingerprint in, if any.
+    """
+    filename, outputs, fingerprint = rendered
+    if manifest is not None:
+        background_filename = manifest.write(filename, outputs, fingerprint)
+    else:
+        for subfolder, data in outputs.items():
+            path = os.path.join(target_folder, subfolder, filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            render_manifest.write_atomic(path, data)
+        # Report the largest size, which comes first
+        background_filename = os.path.join(target_folder, next(iter(outputs)), filename)
+    print(f"Image saved: {background_filename}")
+
+def render_process_context():
+    """
+    Returns the multiprocessing context the render workers are started with.
 
-    except requests.exceptions.HTTPError as e:
-        print(f"Failed to download background for {item.title}: HTTP error {e}")
-    except requests.exceptions.RequestException as e:
-        print(f"Error downloading background for {item.title}: {e}")
-    except Exception as e:
-        print(f"An error occurred while processing {item.title}: {e}")
+    Forking a process while the fetch threads hold locks (HTTP connection pool, cache
+    writes, stdout) can deadlock the child, so the workers are started by a fork server
+    (or spawned where there is none) instead of being forked from this threaded process.
+    """
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+def fetch_with_render_slot(render_slots, *args):
+    """
+    Fetch stage with backpressure: waits for a free render slot before downloading, so
+    fetch threads can't pile up the art of more items than the render pool keeps up with.
+    The slot is released by the writer loop once the item is rendered, or here if the
+    item isn't rendered at all.
+
+    :param render_slots: Semaphore shared by the batch.
+    :param args: Arguments for fetch_item_assets.
+    """
+    render_slots.acquire()
+    try:
+        assets = fetch_item_assets(*args)
+    except BaseException:
+        render_slots.release()
+        raise
+    if assets is None:
+        render_slots.release()
+    return assets
+
+def generate_backgrounds(jobs, background_template, plex_logo, target_folder=None, manifest=None):
+    """
+    Generates backgrounds for many items with a bounded three-stage pipeline:
+    a thread pool downloads art and logos, a process pool composites and encodes,
+    and the calling thread writes finished files as they arrive. Downloads wait while
+    render_queue_per_worker items per render process are already fetched and not yet rendered.
+
+    :param jobs: List of (media_item, media_type, group_type) tuples.
+    :param background_template: Precomposited template.Template.
+    :param plex_logo: Preloaded Plex logo image.
+    :param target_folder: Folder to save the background images to (defaults to current background_dir).
+    :param manifest: RenderManifest of the target folder, or None to always render.
+    """
+    if not jobs:
+        return
+
+    if target_folder is None:
+        target_folder = background_dir
+    target_folder = os.path.normpath(target_folder)
+    os.makedirs(target_folder, exist_ok=True)
+
+    # At most this many fetched items hold their art in memory until rendered
+    worker_count = render_workers or os.cpu_count() or 1
+    render_slots = threading.Semaphore(max(1, worker_count * render_queue_per_worker))
+
+    with ProcessPoolExecutor(max_workers=worker_count,
+                             mp_context=render_process_context(),
+                             initializer=init_render_worker,
+                             initargs=(background_template, plex_logo)) as render_pool, \
+         ThreadPoolExecutor(max_workers=max(1, fetch_workers)) as fetch_pool:
+        # Shared by every item, so it is hashed once instead of on each fetch thread
+        template_fingerprint = get_template_fingerprint()
+
+        titles = {}
+        fetches = set()
+        for item, media_type, group_type in jobs:
+            future = fetch_pool.submit(fetch_with_render_slot, render_slots, item, media_type, group_type,
+                                       manifest, template_fingerprint)
+            titles[future] = item.title
+            fetches.add(future)
+
+        # Single writer loop: hand fetched items to the render pool and write renders as they finish
+        pending = set(fetches)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                title = titles.pop(future)
+                if future not in fetches:
+                    # The item is rendered (or failed), its art can go
+                    render_slots.release()
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"An error occurred while processing {title}: {e}")
+                    continue
+                if future in fetches:
+                    if result is not None:
+                        render_future = render_pool.submit(render_background, result)
+                        titles[render_future] = title
+                        pending.add(render_future)
+                else:
+                    try:
+                        write_background(result, target_folder, manifest)
+                    except (OSError, IOError) as e:
+                        print(f"[ERROR] Failed to save background for {title}: {e}")
+                    except Exception as e:
+                        print(f"An error occurred while processing {title}: {e}")
 
 def download_latest_media(order_by, limit, media_type,
                           target_folder=None,
-                          base_background=None,
-                          overlay=None,
-                          plex_logo=None):
+                          background_template=None,
+                          plex_logo=None,
+                          manifest=None):
     """
     Downloads and processes the latest media items from Plex library.
 
@@ -599,42 +783,16 @@ def download_latest_media(order_by, limit, media_type,
         debug and print("[DEBUG] Series downloads disabled; skipping.")
         return
 
-    def sort_movies(movies, key_attr):
-        """
-        Sort movies based on a given datetime attribute.
-        """
-        filtered = [m for m in movies if getattr(m, key_attr) is not None]
-        return sorted(filtered, key=lambda x: getattr(x, key_attr), reverse=True)
-
-    def sort_shows(shows, key_attr):
-        """
-        Sort TV shows based on the latest episode's datetime attribute.
-        """
-        shows_with_dates = []
-        for show in shows:
-            episodes = show.episodes()
-            episodes_with_date = [ep for ep in episodes if getattr(ep, key_attr) is not None]
-            if episodes_with_date:
-                latest_episode = max(episodes_with_date, key=lambda ep: getattr(ep, key_attr))
-                shows_with_dates.append((show, getattr(latest_episode, key_attr)))
-        return [s[0] for s in sorted(shows_with_dates, key=lambda x: x[1], reverse=True)]
-
     if media_type == 'movie':
-        media_items = plex_instance.library.search(libtype='movie')
-        if order_by == 'aired':
-            media_sorted = sort_movies(media_items, 'originallyAvailableAt')
-        elif order_by == 'added':
-            media_sorted = sort_movies(media_items, 'addedAt')
+        if order_by in plex_sort_fields:
+            media_sorted = search_sorted(get_sections('movie'), order_by, limit)
         else:
             print("Invalid order_by parameter. Please use 'aired' or 'added'.")
             return
 
     elif media_type == 'tv':
-        media_items = plex_instance.library.search(libtype='show')
-        if order_by == 'aired':
-            media_sorted = sort_shows(media_items, 'originallyAvailableAt')
-        elif order_by == 'added':
-            media_sorted = sort_shows(media_items, 'addedAt')
+        if order_by in plex_sort_fields:
+            media_sorted = search_shows_by_latest_episode(get_sections('show'), order_by, limit)
         else:
             print("Invalid order_by parameter. Please use 'aired' or 'added'.")
             return
@@ -644,17 +802,120 @@ def download_latest_media(order_by, limit, media_type,
 
     debug and print(f"[DEBUG] Processing {len(media_sorted[:limit])} {media_type} items sorted by {order_by}")
 
-    for item in media_sorted[:limit]:
-        generate_background_for_item(
-            item,
-            media_type,
-            group_type=order_by,
-            base_background=base_background,
-            overlay=overlay,
-            plex_logo=plex_logo,
-            target_folder=target_folder
-        )
-        time.sleep(plex_api_delay_seconds)
+    generate_backgrounds(
+        [(item, media_type, order_by) for item in media_sorted[:limit]],
+        background_template=background_template,
+        plex_logo=plex_logo,
+        target_folder=target_folder,
+        manifest=manifest
+    )
+
+# Server-side sort keys for each sort type, paired with the attribute they sort on
+plex_sort_fields = {
+    'aired': ('originallyAvailableAt:desc', 'originallyAvailableAt'),
+    'added': ('addedAt:desc', 'addedAt'),
+}
+
+def get_sections(media_type):
+    """
+    Returns the Plex library sections holding the given media type.
+
+    :param media_type: 'movie' or 'show'.
+    :return: List of LibrarySection objects.
+    """
+    return [s for s in plex_instance.library.sections() if s.type == media_type]
+
+def search_sorted(sections, sort_type, count):
+    """
+    Fetches the newest items across sections, letting Plex do the sorting and limiting.
+
+    Each section returns at most `count` items already sorted server-side, so only
+    the top of every section is transferred. The per-section heads are then merged.
+
+    :param sections: LibrarySection objects to query.
+    :param sort_type: 'aired' or 'added'.
+    :param count: Number of items to return.
+    :return: List of media items, newest first.
+    """
+    sort, key_attr = plex_sort_fields[sort_type]
+    items = []
+    for section in sections:
+        items.extend(section.search(sort=sort, libtype=section.type, maxresults=count,
+                                    container_size=count))
+
+    filtered = [i for i in items if getattr(i, key_attr, None) is not None]
+    return sorted(filtered, key=lambda x: getattr(x, key_attr), reverse=True)[:count]
+
+def search_random(sections, count):
+    """
+    Picks random items across sections by sampling offsets instead of loading every item.
+
+    Offsets are drawn over the combined size of all sections, then each one is
+    fetched as a single-item page.
+
+    :param sections: LibrarySection objects to query.
+    :param count: Number of items to return.
+    :return: List of randomly picked media items.
+    """
+    sizes = [section.totalViewSize(libtype=section.type, includeCollections=False) for section in sections]
+    total = sum(sizes)
+    if total == 0:
+        return []
+
+    items = []
+    for offset in sorted(random.sample(range(total), min(count, total))):
+        # Map the global offset onto the section that holds it
+        for section, size in zip(sections, sizes):
+            if offset < size:
+                items.extend(section.search(libtype=section.type, maxresults=1,
+                                            container_start=offset, container_size=1))
+                break
+            offset -= size
+
+    random.shuffle(items)
+    return items
+
+def search_shows_by_latest_episode(sections, sort_type, count, page_size=200):
+    """
+    Fetches the shows with the newest episodes without walking every show's episode list.
+
+    Episodes are requested in pages already sorted by date, and the first episode seen
+    for each grandparentRatingKey is that show's latest one. Paging stops as soon as
+    enough shows are found, then the shows themselves are loaded in a single request.
+
+    :param sections: Show LibrarySection objects to query.
+    :param sort_type: 'aired' or 'added'.
+    :param count: Number of shows to return.
+    :param page_size: Number of episodes requested per page.
+    :return: List of shows, ordered by their latest episode date (newest first).
+    """
+    sort, key_attr = plex_sort_fields[sort_type]
+    latest_dates = {}
+    for section in sections:
+        found = 0
+        start = 0
+        while found < count:
+            episodes = section.search(sort=sort, libtype='episode', maxresults=page_size,
+                                      container_start=start, container_size=page_size)
+            for episode in episodes:
+                date = getattr(episode, key_attr, None)
+                show_key = episode.grandparentRatingKey
+                if date is None or show_key in latest_dates:
+                    continue
+                latest_dates[show_key] = date
+                found += 1
+            if len(episodes) < page_size:
+                break  # Reached the end of the section
+            start += page_size
+
+    show_keys = sorted(latest_dates, key=lambda k: latest_dates[k], reverse=True)[:count]
+    if not show_keys:
+        return []
+
+    # Load all selected shows at once; Plex accepts a comma-separated list of ratingKeys
+    shows = plex_instance.fetchItems(f"/library/metadata/{','.join(str(k) for k in show_keys)}")
+    shows_by_key = {show.ratingKey: show for show in shows}
+    return [shows_by_key[k] for k in show_keys if k in shows_by_key]
 
 def fetch_items(media_type, sort_type, count):
     """
@@ -673,34 +934,19 @@ def fetch_items(media_type, sort_type, count):
     initialize_plex_connection()
 
     # Get sections relevant for the media type
-    if media_type == 'movie':
-        sections = [s for s in plex_instance.library.sections() if s.type == 'movie']
-    elif media_type == 'show':
-        sections = [s for s in plex_instance.library.sections() if s.type == 'show']
-    else:
+    if media_type not in ('movie', 'show'):
         print(f"[ERROR] Invalid media_type: {media_type}. Expected 'movie' or 'show'.")
         return []
+    sections = get_sections(media_type)
 
-    # Aggregate all items from all sections
-    items = []
-    for section in sections:
-        items.extend(section.search())
-
-    # Sort/filter items based on sort_type
-    if sort_type == 'aired':
-        filtered = [i for i in items if getattr(i, 'originallyAvailableAt', None) is not None]
-        sorted_items = sorted(filtered, key=lambda x: x.originallyAvailableAt, reverse=True)
-    elif sort_type == 'added':
-        filtered = [i for i in items if getattr(i, 'addedAt', None) is not None]
-        sorted_items = sorted(filtered, key=lambda x: x.addedAt, reverse=True)
+    # Sorting, limiting and random sampling all happen on the Plex server
+    if sort_type in plex_sort_fields:
+        return search_sorted(sections, sort_type, count)
     elif sort_type == 'random':
-        # Random sample (no sort needed)
-        return random.sample(items, min(count, len(items)))
+        return search_random(sections, count)
     else:
         return []
 
-    return sorted_items[:count]
-
 def dedup(items, seen):
     """
     Remove duplicates from a list of media items based on their unique ratingKey.
@@ -802,7 +1048,7 @@ def get_mixed_media(limit, download_movies=True, download_series=True, seen=None
     return combined
 
 def main_process(order_by, limit, download_movies, download_series,
-                 base_background, overlay, plex_logo):
+                 background_template, plex_logo, manifest=None):
     """
     Main execution logic to select and process media items
     based on the 'order_by' parameter.
@@ -812,36 +1058,25 @@ def main_process(order_by, limit, download_movies, download_series,
     initialize_plex_connection()
 
     if order_by == 'mix':
-        # Mixed mode: fetch per-type to respect limit for each
+        # Mixed mode: fetch per-type to respect limit for each, then render all items in one pipeline
+        jobs = []
         if download_movies:
             movie_seen = set()
             movie_items = get_mixed_media(limit, download_movies=True, download_series=False, seen=movie_seen)
-            for item, group_type in movie_items:
-                generate_background_for_item(
-                    item,
-                    media_type='movie',
-                    group_type=group_type,
-                    base_background=base_background,
-                    overlay=overlay,
-                    plex_logo=plex_logo,
-                    target_folder=background_dir
-                )
-                time.sleep(plex_api_delay_seconds)
+            jobs.extend((item, 'movie', group_type) for item, group_type in movie_items)
 
         if download_series:
             show_seen = set()
             show_items = get_mixed_media(limit, download_movies=False, download_series=True, seen=show_seen)
-            for item, group_type in show_items:
-                generate_background_for_item(
-                    item,
-                    media_type='tv',
-                    group_type=group_type,
-                    base_background=base_background,
-                    overlay=overlay,
-                    plex_logo=plex_logo,
-                    target_folder=background_dir
-                )
-                time.sleep(plex_api_delay_seconds)
+            jobs.extend((item, 'tv', group_type) for item, group_type in show_items)
+
+        generate_backgrounds(
+            jobs,
+            background_template=background_template,
+            plex_logo=plex_logo,
+            target_folder=background_dir,
+            manifest=manifest
+        )
 
     else:
         # Single mode: download movies and/or series based on order_by parameter
@@ -849,17 +1084,17 @@ def main_process(order_by, limit, download_movies, download_series,
             download_latest_media(
                 order_by, limit, 'movie',
                 target_folder=background_dir,
-                base_background=base_background,
-                overlay=overlay,
-                plex_logo=plex_logo
+                background_template=background_template,
+                plex_logo=plex_logo,
+                manifest=manifest
             )
         if download_series:
             download_latest_media(
                 order_by, limit, 'tv',
                 target_folder=background_dir,
-                base_background=base_background,
-                overlay=overlay,
-                plex_logo=plex_logo
+                background_template=background_template,
+                plex_logo=plex_logo,
+                manifest=manifest
             )
 
 # === Main Execution Logic ===
@@ -873,6 +1108,7 @@ metadata_color = validate_color(metadata_color, "white")
 
 shadow_color = validate_color(shadow_color, "black")
 shadow_offset = validate_shadow_offset(shadow_offset, 2)
+shadow_blur = validate_shadow_blur(shadow_blur, 0)
 
 # Catch errors with Plex logo offset variable
 try:
@@ -919,12 +1155,17 @@ if not font_downloaded:
     print("[ERROR] No valid font available. The script cannot proceed without a font.")
     exit(1)  # Exit the script if no font is available
 
+# Check once that the font can draw the labels, instead of finding out per background
+fonts.check_coverage(truetype_path, text=added_label + aired_label + random_label + default_label)
+
 if __name__ == "__main__":
+    # Tracks which backgrounds can be kept from the previous run
+    manifest = render_manifest.RenderManifest(background_dir)
+
     # Load overlay resources once at module load
     BASE_PATH = os.path.dirname(__file__)
     try:
-        base_background = Image.open(os.path.join(BASE_PATH, "bckg.png")).convert('RGBA')
-        overlay = Image.open(os.path.join(BASE_PATH, "overlay.png")).convert('RGBA')
+        background_template = template.get_template()
         plex_logo = Image.open(os.path.join(BASE_PATH, plex_logo_file)).convert('RGBA')
     except Exception as e:
         print(f"[ERROR] Failed to load overlay images: {e}")
@@ -936,7 +1177,10 @@ if __name__ == "__main__":
         limit=limit,
         download_movies=download_movies,
         download_series=download_series,
-        base_background=base_background,
-        overlay=overlay,
-        plex_logo=plex_logo
+        background_template=background_template,
+        plex_logo=plex_logo,
+        manifest=manifest
     )
+
+    # Remove backgrounds of items that are no longer selected
+    manifest.finish()
@@ -0,0 +1,150 @@
+# === Standard Library Imports ===
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# === Third-Party Imports ===
+import requests
+
+# Shared per-host rate limiting for all scripts.
+# Each host gets a token bucket: up to `burst` requests go out immediately, after which
+# requests are spaced to `rate` per second. A 429 or 503 pauses the whole host for as long
+# as the server asks (Retry-After) or an exponential backoff, so we only wait when the
+# remote needs us to. http_client leaves both statuses to this module.
+
+# Default (rate per second, burst) per host; other hosts use default_rate.
+# A rate of None means no limit, but Retry-After pauses are still honoured.
+host_rates = {
+    'api.themoviedb.org': (40, 40),
+    'image.tmdb.org': (None, None),
+    'api.trakt.tv': (3, 20),           # Trakt allows 1000 GET calls every 5 minutes
+    'oauth.reddit.com': (1, 5),
+    'www.reddit.com': (1, 5),
+    'github.com': (None, None),
+}
+default_rate = (10, 10)
+
+# How many times a request is re-sent after a 429 or 503 response
+max_rate_limit_retries = 3
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing a burst of requests followed by a sustained rate.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: Sustained requests per second, or None for no limit.
+        :param burst: Requests allowed back to back (defaults to one second's worth).
+        """
+        self.rate = rate
+        self.burst = max(1, burst or rate or 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent, then consumes one token.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif not self.rate:
+                    return
+                else:
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Holds back all requests for the given number of seconds and empties the bucket,
+        so requests resume at the sustained rate instead of as a burst.
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.updated = self.paused_until
+
+
+limiters = {}
+limiters_lock = threading.Lock()
+
+
+def host_of(url):
+    """
+    Returns the lowercased host (with port) of a URL, or the value itself if it is already a host.
+    """
+    return (urlsplit(url).netloc or url).lower()
+
+
+def get_limiter(url):
+    """
+    Returns the token bucket for the host of the given URL, creating it on first use.
+    """
+    host = host_of(url)
+    with limiters_lock:
+        if host not in limiters:
+            rate, burst = host_rates.get(host, default_rate)
+            limiters[host] = TokenBucket(rate, burst)
+        return limiters[host]
+
+
+def set_rate(url, rate, burst=None):
+    """
+    Configures the rate limit for the host of the given URL (e.g. a Plex or Jellyfin server).
+
+    :param url: URL or host name.
+    :param rate: Sustained requests per second, or None for no limit.
+    :param burst: Requests allowed back to back.
+    """
+    host = host_of(url)
+    with limiters_lock:
+        host_rates[host] = (rate, burst)
+        limiters[host] = TokenBucket(rate, burst)
+
+
+def retry_after_seconds(response, default=None):
+    """
+    Reads the Retry-After header of a response, which is either seconds or an HTTP date.
+
+    :return: Seconds to wait, or default if the header is missing or invalid.
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class RateLimitedSession(requests.Session):
+    """
+    requests.Session that waits for the per-host token bucket before each request and
+    re-sends requests the server rejected with 429 or 503 once its Retry-After has passed.
+    """
+
+    def request(self, method, url, *args, **kwargs):
+        limiter = get_limiter(url)
+        for attempt in range(max_rate_limit_retries + 1):
+            limiter.acquire()
+            response = super().request(method, url, *args, **kwargs)
+            if response.status_code not in (429, 503) or attempt == max_rate_limit_retries:
+                return response
+            limiter.pause(retry_after_seconds(response, default=2 ** attempt))
+            response.close()
@@ -0,0 +1,214 @@
+# === Standard Library Imports ===
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+# === Local Imports ===
+import encoder
+import template
+import variants
+
+# Incremental rendering for the background folders.
+# Each output file is recorded in a manifest together with a fingerprint of everything
+# that went into it (item id, art and logo identity, metadata text, template images,
+# font and style settings). On the next run an item whose fingerprint is unchanged keeps
+# its existing file and is not rendered again; files of items that are no longer selected
+# are removed once the run has finished. Outputs and the manifest are written to a temp
+# file and renamed into place, so a folder never holds half-written images.
+# With several output sizes, each file exists once per size subfolder (see variants)
+# and all of them share the one manifest in the background folder.
+
+manifest_filename = '.render_manifest.json'
+
+# Bump when the rendering code changes in a way that should re-render every output
+manifest_version = 3
+
+file_fingerprints = {}
+
+
+def fingerprint(*parts):
+    """
+    Returns a stable hash of the given values (strings, numbers, lists, dicts...).
+    """
+    data = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def file_fingerprint(path):
+    """
+    Returns a hash of a file's contents (e.g. a template image or font), computed once per process.
+    """
+    stat = os.stat(path)
+    cache_key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+    if cache_key not in file_fingerprints:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        file_fingerprints[cache_key] = digest.hexdigest()
+    return file_fingerprints[cache_key]
+
+
+def files_fingerprint(paths):
+    """
+    Returns one hash covering several files, e.g. all template images plus the font.
+    """
+    return fingerprint(*[file_fingerprint(path) for path in paths])
+
+
+def template_fingerprint(logo_file, font_path, *settings):
+    """
+    Returns a fingerprint of everything a script's backgrounds share: the background,
+    overlay and source logo images, the font, the output encoder settings and any style
+    settings the script passes (colours, offsets...).
+
+    :param logo_file: File name of the source logo next to bckg.png, e.g. "tmdblogo.png".
+    :param font_path: Path of the TrueType font.
+    :param settings: Extra values the rendering depends on.
+    """
+    return fingerprint(
+        files_fingerprint([
+            os.path.join(template.BASE_PATH, "bckg.png"),
+            os.path.join(template.BASE_PATH, "overlay.png"),
+            os.path.join(template.BASE_PATH, logo_file),
+            font_path,
+        ]),
+        *settings,
+        encoder.get_settings(),
+    )
+
+
+def write_atomic(path, data):
+    """
+    Writes bytes to path through a temp file in the same folder and an atomic rename.
+    """
+    folder = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class RenderManifest:
+    """
+    Tracks the fingerprint of every output file in a background folder across runs.
+    """
+
+    def __init__(self, output_dir, sizes=None):
+        """
+        :param output_dir: Folder holding the rendered backgrounds and the manifest.
+        :param sizes: Output sizes, each written to its own subfolder; defaults to
+            variants.get_sizes(), [] for one full-size file in output_dir itself.
+        """
+        self.output_dir = output_dir
+        self.sizes = variants.get_sizes() if sizes is None else sizes
+        self.subfolders = variants.subfolders(self.sizes)
+        self.path = os.path.join(output_dir, manifest_filename)
+        self.previous = {}
+        self.previous_subfolders = []
+        self.entries = {}
+        self.selected = set()
+        self.lock = threading.Lock()
+
+        for subfolder in self.subfolders:
+            os.makedirs(os.path.join(output_dir, subfolder), exist_ok=True)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.previous_subfolders = data.get('folders', [''])
+            if data.get('version') == manifest_version:
+                self.previous = data.get('files', {})
+        except (OSError, ValueError):
+            pass
+
+    def is_current(self, filename, item_fingerprint):
+        """
+        Marks filename as part of this run's selection and reports whether its existing
+        output was rendered from the same inputs, in which case it can be kept as is.
+        """
+        with self.lock:
+            self.selected.add(filename)
+            if (self.previous.get(filename) == item_fingerprint
+                    and all(os.path.exists(os.path.join(self.output_dir, subfolder, filename))
+                            for subfolder in self.subfolders)):
+                self.entries[filename] = item_fingerprint
+                return True
+            return False
+
+    def write(self, filename, outputs, item_fingerprint):
+        """
+        Atomically writes encoded images as filename and records its fingerprint.
+
+        :param outputs: Dict of size subfolder to encoded bytes, as returned by variants.encode.
+        :return: Full path of the written file (of the largest size).
+        """
+        paths = []
+        for subfolder, data in outputs.items():
+            path = os.path.join(self.output_dir, subfolder, filename)
+            write_atomic(path, data)
+            paths.append(path)
+        with self.lock:
+            self.selected.add(filename)
+            self.entries[filename] = item_fingerprint
+        return paths[0]
+
+    def save(self, image, filename, item_fingerprint, encoder_settings=None):
+        """
+        Atomically saves a PIL image as filename at every output size, encoded with the
+        configured output format, and records its fingerprint.
+
+        :return: Full path of the written file (of the largest size).
+        """
+        outputs = variants.encode(image, self.sizes, encoder_settings)
+        return self.write(filename, outputs, item_fingerprint)
+
+    def remove_stale(self, subfolder, keep_selected):
+        """
+        Removes the files of a subfolder that aren't part of this run's selection.
+        """
+        folder = os.path.join(self.output_dir, subfolder)
+        if not os.path.isdir(folder):
+            return
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if name == manifest_filename or (keep_selected and name in self.selected) or not os.path.isfile(path):
+                continue
+            try:
+                os.remove(path)
+                print(f"Removed: {path}")
+            except OSError as e:
+                print(f"Failed to remove {path}: {e}")
+
+    def finish(self):
+        """
+        Removes outputs that are no longer selected and saves the manifest.
+
+        Selected items that failed to render keep their previous file and fingerprint, so
+        they are retried next run. If nothing was selected at all (e.g. the server could not
+        be reached) the folder is left untouched.
+        """
+        with self.lock:
+            if not self.selected:
+                return
+
+            # Outputs of sizes that are no longer configured are removed too
+            for subfolder in dict.fromkeys(self.subfolders + self.previous_subfolders + ['']):
+                self.remove_stale(subfolder, keep_selected=subfolder in self.subfolders)
+                if subfolder and subfolder not in self.subfolders:
+                    try:
+                        os.rmdir(os.path.join(self.output_dir, subfolder))
+                    except OSError:
+                        pass
+
+            files = {name: fp for name, fp in self.previous.items() if name in self.selected}
+            files.update(self.entries)
+            data = json.dumps({'version': manifest_version, 'folders': self.subfolders, 'files': files},
+                              indent=2, ensure_ascii=False)
+            write_atomic(self.path, data.encode('utf-8'))
@@ -0,0 +1,82 @@
+# === Standard Library Imports ===
+import os
+
+# === Third-Party Imports ===
+from PIL import Image
+
+# Static background template shared by all renders in a process.
+# bckg.png and the source logo (TMDB, Jellyfin, Trakt...) never change between items,
+# so they are flattened once into an RGB base. The overlay is split once into its colour
+# layer and its alpha mask, cropped to the part that lands on the canvas. Rendering an
+# item is then one copy of the base, the art blit and a single masked paste of the
+# overlay region, instead of reopening and alpha-pasting every PNG for every item.
+# Canvases stay RGB from start to save: alpha is only applied inside the boxes that
+# change (overlay, logos, text), never to a full RGBA canvas.
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+
+templates = {}
+
+
+class Template:
+    """
+    Precomposited background layers and the cached overlay mask.
+    """
+
+    def __init__(self, source_logo_file=None, source_logo_position=None, overlay_position=(1175, 0)):
+        """
+        :param source_logo_file: File name of the source logo (e.g. "tmdblogo.png"), or None.
+        :param source_logo_position: Where the source logo is pasted.
+        :param overlay_position: Top-left corner of overlay.png on the canvas, or None to
+            align it with the top right corner.
+        """
+        base = Image.open(os.path.join(BASE_PATH, "bckg.png")).convert('RGBA')
+        self.source_logo = None
+        if source_logo_file:
+            self.source_logo = Image.open(os.path.join(BASE_PATH, source_logo_file)).convert('RGBA')
+            self.source_logo_position = source_logo_position
+            base.paste(self.source_logo, source_logo_position, self.source_logo)
+        self.base = base.convert('RGB')
+        self.size = self.base.size
+
+        overlay = Image.open(os.path.join(BASE_PATH, "overlay.png")).convert('RGBA')
+        if overlay_position is None:
+            overlay_position = (self.size[0] - overlay.width, 0)
+
+        # Keep only the part of the overlay that lands on the canvas
+        left, top = overlay_position
+        right = min(left + overlay.width, self.size[0])
+        bottom = min(top + overlay.height, self.size[1])
+        overlay = overlay.crop((0, 0, right - left, bottom - top))
+        self.overlay_box = (left, top, right, bottom)
+        self.overlay_color = overlay.convert('RGB')
+        self.overlay_mask = overlay.getchannel('A')
+
+    def render(self, art, art_position):
+        """
+        Returns a new RGB canvas with the art pasted at art_position under the overlay.
+        The canvas can be saved as JPEG as is, without converting it.
+
+        :param art: Resized background art.
+        :param art_position: Top-left corner of the art on the canvas.
+        """
+        canvas = self.base.copy()
+        canvas.paste(art if art.mode == 'RGB' else art.convert('RGB'), art_position)
+
+        # Blend the overlay over the art in place, in its own region only
+        canvas.paste(self.overlay_color, self.overlay_box[:2], self.overlay_mask)
+
+        # Very wide art can reach the source logo, which always stays on top
+        if self.source_logo and art_position[0] < self.source_logo_position[0] + self.source_logo.width:
+            canvas.paste(self.source_logo, self.source_logo_position, self.source_logo)
+        return canvas
+
+
+def get_template(source_logo_file=None, source_logo_position=None, overlay_position=(1175, 0)):
+    """
+    Returns the Template for these settings, building it on first use in this process.
+    """
+    key = (source_logo_file, source_logo_position, overlay_position)
+    if key not in templates:
+        templates[key] = Template(source_logo_file, source_logo_position, overlay_position)
+    return templates[key]
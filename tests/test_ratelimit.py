@@ -0,0 +1,58 @@
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ratelimit  # noqa: E402
+from http_client import session  # noqa: E402
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    """
+    Answers the first request with 429 and Retry-After, and the following ones with 200.
+    """
+    requests_seen = 0
+
+    def do_GET(self):
+        ThrottlingHandler.requests_seen += 1
+        if ThrottlingHandler.requests_seen == 1:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class RetryAfterTest(unittest.TestCase):
+
+    def setUp(self):
+        ThrottlingHandler.requests_seen = 0
+        self.server = HTTPServer(('127.0.0.1', 0), ThrottlingHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/throttled"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_429_pauses_the_host_bucket(self):
+        limiter = ratelimit.get_limiter(self.url)
+        with mock.patch.object(limiter, 'pause', wraps=limiter.pause) as pause:
+            response = session.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        pause.assert_called_once_with(1.0)
+        self.assertEqual(ThrottlingHandler.requests_seen, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+# === Standard Library Imports ===
+import math
+from functools import lru_cache
+
+# === Third-Party Imports ===
+from PIL import Image, ImageDraw, ImageFilter
+
+# Text measurement and line breaking shared by the renderers.
+# Widths are measured once per (font, string) and kept in an LRU cache; fonts come from
+# the fonts registry, so the same font object is reused for every background. Lines are
+# broken in one pass by adding up cached word widths, and only a line that ends close to
+# the limit is measured as a whole, so kerning can't push it past max_width.
+# Shadowed text is rasterized once into an L mask that both the shadow and the fill are
+# painted through; only the masks of repeated strings (labels, custom text) are cached.
+
+# Scratch surface for measuring multiline text
+measure_draw = ImageDraw.Draw(Image.new('L', (1, 1)))
+
+
+@lru_cache(maxsize=8192)
+def text_width(font, text):
+    """
+    Returns the advance width of a single line of text in pixels.
+    """
+    return font.getlength(text)
+
+
+@lru_cache(maxsize=1024)
+def text_bbox(font, text):
+    """
+    Returns the (left, top, right, bottom) box of a single line of text drawn at (0, 0).
+    """
+    return font.getbbox(text)
+
+
+def split_long_word(word, font, max_width):
+    """
+    Splits a word wider than max_width into pieces that each fit.
+    """
+    pieces = []
+    piece = ""
+    piece_width = 0
+    for char in word:
+        char_width = text_width(font, char)
+        if piece and piece_width + char_width > max_width:
+            pieces.append(piece)
+            piece, piece_width = char, char_width
+        else:
+            piece += char
+            piece_width += char_width
+    pieces.append(piece)
+    return pieces
+
+
+def wrap_text(text, font, max_width):
+    """
+    Wraps text into lines no wider than max_width pixels, splitting words that don't fit on a line of their own.
+
+    :param text: The input text to wrap.
+    :param font: PIL ImageFont object.
+    :param max_width: Maximum width in pixels.
+    :return: List of lines.
+    """
+    space_width = text_width(font, " ")
+    lines = []
+    line_words = []
+    line_width = 0
+
+    for word in text.split():
+        word_width = text_width(font, word)
+
+        if word_width > max_width:
+            if line_words:
+                lines.append(" ".join(line_words))
+            pieces = split_long_word(word, font, max_width)
+            lines.extend(pieces[:-1])
+            line_words = [pieces[-1]]
+            line_width = text_width(font, pieces[-1])
+            continue
+
+        if not line_words:
+            line_words = [word]
+            line_width = word_width
+            continue
+
+        new_width = line_width + space_width + word_width
+        # Kerning around spaces can move the real width slightly, so measure lines near the limit
+        if abs(new_width - max_width) <= space_width:
+            new_width = text_width(font, " ".join(line_words + [word]))
+
+        if new_width <= max_width:
+            line_words.append(word)
+            line_width = new_width
+        else:
+            lines.append(" ".join(line_words))
+            line_words = [word]
+            line_width = word_width
+
+    if line_words:
+        lines.append(" ".join(line_words))
+
+    return lines
+
+
+def block_height(font, lines, spacing=4):
+    """
+    Returns the height of lines drawn as one multiline block, as ImageDraw.multiline_textbbox measures it.
+
+    :param font: PIL ImageFont object.
+    :param lines: Lines of the block, as returned by wrap_text.
+    :param spacing: Pixels between lines (ImageDraw's default is 4).
+    """
+    if not lines:
+        return 0
+    line_spacing = text_bbox(font, "A")[3] + spacing
+    tops = []
+    bottoms = []
+    for index, line in enumerate(lines):
+        _, top, _, bottom = text_bbox(font, line)
+        tops.append(index * line_spacing + top)
+        bottoms.append(index * line_spacing + bottom)
+    return max(bottoms) - min(tops)
+
+
+def rasterize_text(font, text, spacing=4):
+    """
+    Rasterizes text once into an L mask, the way ImageDraw.text would draw it at (0, 0).
+
+    :param font: PIL ImageFont object.
+    :param text: Text to draw, may contain newlines.
+    :param spacing: Pixels between lines of multiline text.
+    :return: Tuple of (mask, (left, top)), the offset of the mask from the text position.
+    """
+    left, top, right, bottom = measure_draw.textbbox((0, 0), text, font=font, spacing=spacing)
+    mask = Image.new('L', (max(right - left, 1), max(bottom - top, 1)))
+    ImageDraw.Draw(mask).text((-left, -top), text, font=font, fill=255, spacing=spacing)
+    return mask, (left, top)
+
+
+def blur_mask(mask, offset, blur):
+    """
+    Returns a text mask blurred by a Gaussian of radius blur, padded so the blur isn't clipped.
+
+    :param mask: Mask from rasterize_text.
+    :param offset: (left, top) offset of the mask from the text position.
+    :param blur: Blur radius, 0 to return the mask as is.
+    :return: Tuple of (mask, (left, top)).
+    """
+    if not blur:
+        return mask, offset
+    pad = math.ceil(blur * 3)
+    padded = Image.new('L', (mask.width + 2 * pad, mask.height + 2 * pad))
+    padded.paste(mask, (pad, pad))
+    return padded.filter(ImageFilter.GaussianBlur(blur)), (offset[0] - pad, offset[1] - pad)
+
+
+# Only strings drawn on every background (labels, custom text) go through these caches;
+# titles and summaries are used once and would only hold on to large masks
+@lru_cache(maxsize=32)
+def text_mask(font, text, spacing=4):
+    """
+    Cached rasterize_text, for strings repeated across backgrounds.
+    """
+    return rasterize_text(font, text, spacing)
+
+
+@lru_cache(maxsize=32)
+def shadow_mask(font, text, blur=0, spacing=4):
+    """
+    Cached shadow mask of a repeated string.
+    """
+    mask, offset = text_mask(font, text, spacing)
+    return blur_mask(mask, offset, blur)
+
+
+def draw_text_with_shadow(image, position, text, font, fill_color, shadow_color,
+                          shadow_offset=(2, 2), shadow_blur=0, spacing=4, cache=False):
+    """
+    Draws text with a drop shadow, painting both through one mask.
+
+    :param image: Image to draw on.
+    :param position: Top-left (x, y) of the text, as for ImageDraw.text.
+    :param text: Text to draw, may contain newlines.
+    :param font: PIL ImageFont object.
+    :param fill_color: Colour of the text.
+    :param shadow_color: Colour of the shadow.
+    :param shadow_offset: (x, y) offset of the shadow from the text.
+    :param shadow_blur: Gaussian blur radius of the shadow, 0 for a hard shadow.
+    :param spacing: Pixels between lines of multiline text.
+    :param cache: Keep the masks for next time; only for strings every background repeats, like labels.
+    """
+    if not text:
+        return
+    x, y = position
+    if cache:
+        mask, (left, top) = text_mask(font, text, spacing)
+        shadow, (shadow_left, shadow_top) = shadow_mask(font, text, shadow_blur, spacing)
+    else:
+        mask, (left, top) = rasterize_text(font, text, spacing)
+        shadow, (shadow_left, shadow_top) = blur_mask(mask, (left, top), shadow_blur)
+    image.paste(shadow_color, (x + shadow_offset[0] + shadow_left, y + shadow_offset[1] + shadow_top), shadow)
+    image.paste(fill_color, (x + left, y + top), mask)
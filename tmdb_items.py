@@ -0,0 +1,100 @@
+# === Standard Library Imports ===
+from dataclasses import dataclass, field
+from typing import Optional
+
+# === Local Imports ===
+import http_cache
+
+# Loader for TMDB movies and TV shows.
+# Details, keywords and images of an item come from a single request using
+# append_to_response=keywords,images, and are returned as one TmdbItem record that the
+# filters, the logo picker and the renderer all share, instead of a separate details,
+# keywords and images request (and repeated details requests) per item.
+
+api_url = "https://api.themoviedb.org/3/"
+
+
+@dataclass
+class TmdbItem:
+    """
+    A TMDB movie or TV show with its keywords and images.
+    """
+    media_type: str                  # "movie" or "tv"
+    id: int
+    title: str
+    overview: str = ""
+    date: Optional[str] = None       # Release date (movies) or first air date (TV shows)
+    last_air_date: Optional[str] = None
+    vote_average: float = 0.0
+    genres: list = field(default_factory=list)
+    origin_country: list = field(default_factory=list)
+    runtime: Optional[int] = None
+    number_of_seasons: Optional[int] = None
+    backdrop_path: Optional[str] = None
+    keywords: list = field(default_factory=list)  # Lowercase keyword names
+    logos: list = field(default_factory=list)     # Logo entries from the images endpoint
+    details: dict = field(default_factory=dict)   # Full details response
+
+    @classmethod
+    def from_response(cls, media_type, data):
+        """
+        Builds a record from a details response that has keywords and images appended.
+        """
+        keywords = data.get("keywords", {})
+        keywords = keywords.get("keywords" if media_type == "movie" else "results", [])
+        return cls(
+            media_type=media_type,
+            id=data["id"],
+            title=data.get("title" if media_type == "movie" else "name", ""),
+            overview=data.get("overview") or "",
+            date=data.get("release_date" if media_type == "movie" else "first_air_date"),
+            last_air_date=data.get("last_air_date"),
+            vote_average=data.get("vote_average", 0.0),
+            genres=[genre["name"] for genre in data.get("genres", [])],
+            origin_country=data.get("origin_country")
+            or [country["iso_3166_1"] for country in data.get("production_countries", [])],
+            runtime=data.get("runtime"),
+            number_of_seasons=data.get("number_of_seasons"),
+            backdrop_path=data.get("backdrop_path"),
+            keywords=[keyword["name"].lower() for keyword in keywords],
+            logos=data.get("images", {}).get("logos", []),
+            details=data,
+        )
+
+    def logo(self, language):
+        """
+        Returns the first PNG logo in the given language (ISO 639-1, e.g. "ru"), or None.
+        """
+        for logo in self.logos:
+            if logo.get("iso_639_1") == language and logo["file_path"].endswith(".png"):
+                return logo
+        return None
+
+
+def load_item(media_type, item_id, headers, language="en-US", image_language=None, ttl=None):
+    """
+    Fetches a movie or TV show with its keywords and images in one request.
+
+    :param media_type: "movie" or "tv".
+    :param item_id: TMDB id.
+    :param headers: Request headers with the TMDB authorization.
+    :param language: Language of the details, e.g. "ru-RU".
+    :param image_language: Language of the images to include, defaults to that of language.
+    :param ttl: Seconds a cached response is used without revalidation (defaults to http_cache's).
+    :return: TmdbItem, or None if the item could not be loaded.
+    """
+    image_language = image_language or language.split("-")[0]
+    response = http_cache.get(
+        f"{api_url}{media_type}/{item_id}",
+        headers=headers,
+        params={
+            "language": language,
+            "append_to_response": "keywords,images",
+            "include_image_language": image_language,
+        },
+        ttl=ttl,
+    )
+    if response.status_code != 200:
+        print(f"Failed to load TMDB {media_type} {item_id}. Status code: {response.status_code}")
+        return None
+    return TmdbItem.from_response(media_type, response.json())
@@ -1,11 +1,22 @@
-import requests
-from PIL import Image, ImageDraw, ImageFont, ImageFilter, UnidentifiedImageError
+from PIL import Image, ImageDraw, ImageFilter, UnidentifiedImageError
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 import os
-import shutil
 from urllib.request import urlopen
 import textwrap
 
+import backdrops
+import encoder
+import fonts
+import http_cache
+import image_cache
+import logos
+import render_manifest
+import template
+import text_layout
+import tmdb_items
+from http_client import session
+
 
 # Replace with your actual Trakt API key, TMDB API Read Access Token, username, and list name
 trakt_api_key = "XXXX"
@@ -18,15 +29,17 @@ tmdb_headers = {
     "Authorization": "Bearer XXXXX"
 }
 
-# Base URL for the API
-url = "https://api.themoviedb.org/3/"
+# List ingestion
+trakt_page_size = 100             # List entries requested per Trakt API page
+resolve_workers = 8               # TMDB records loaded at the same time
+metadata_ttl = 3 * 24 * 3600      # Seconds a list entry's cached TMDB record is reused before it is revalidated
 
 # Save font locally
 truetype_url = 'https://github.com/googlefonts/roboto/raw/main/src/hinted/Roboto-Light.ttf'
 truetype_path = 'Roboto-Light.ttf'
 if not os.path.exists(truetype_path):
     try:
-        response = requests.get(truetype_url, timeout=10)
+        response = session.get(truetype_url, timeout=10)
         if response.status_code == 200:
             with open(truetype_path, 'wb') as f:
                 f.write(response.content)
@@ -36,6 +49,9 @@ if not os.path.exists(truetype_path):
     except Exception as e:
         print(f"An error occurred while downloading the Roboto-Light font: {e}")
 
+# Make sure the font can draw the metadata language before rendering anything
+fonts.check_coverage(truetype_path, "en-US", text=f"Now on my {list_name} ")
+
 # Function to truncate the overview text if it exceeds a certain length
 def truncate_overview(overview, max_chars):
     if len(overview) > max_chars:
@@ -48,8 +64,12 @@ def clean_filename(filename):
     cleaned_filename = "".join(c if c.isalnum() or c in "._-" else "_" for c in filename)
     return cleaned_filename
 
-# Function to fetch movies and shows from Trakt API
-def get_trakt_movies_and_shows(api_key, username, list_name):
+# Trakt item types and the TMDB media type they map to
+trakt_media_types = {'movie': 'movie', 'show': 'tv'}
+
+# Function to fetch the list entries from Trakt API page by page, tagged once with their TMDB media type.
+# Pages go through the HTTP cache, so the Trakt and TMDB ids of an unchanged list are revalidated, not downloaded again.
+def get_trakt_list_items(api_key, username, list_name):
     url = f"https://api.trakt.tv/users/{username}/lists/{list_name}/items"
     traktheaders = {
         "Content-Type": "application/json",
@@ -57,33 +77,48 @@ def get_trakt_movies_and_shows(api_key, username, list_name):
         "trakt-api-key": api_key
     }
 
-    response = requests.get(url, headers=traktheaders)
-    if response.status_code == 200:
-        items = response.json()
-        movies = [(item['movie']['title'], item['movie']['ids']['tmdb']) for item in items if item['type'] == 'movie']
-        shows = [(item['show']['title'], item['show']['ids']['tmdb']) for item in items if item['type'] == 'show']
-        return movies, shows
-    else:
-        print(f"Error: Unable to fetch list (status code {response.status_code})")
-        return [], []
-
-# Function to fetch the logo for a movie or TV show from TMDB
-def get_logo(media_type, media_id, language="en"):
-    logo_url = f"{url}{media_type}/{media_id}/images?language={language}"
-    logo_response = requests.get(logo_url, headers=tmdb_headers)
-    logo_data = logo_response.json()
-    if logo_response.status_code == 200:
-        logos = logo_response.json().get("logos", [])
-        for logo in logos:
-            if logo["iso_639_1"] == "en" and logo["file_path"].endswith(".png"):
-                return logo["file_path"]
-    return None
-
-# Function to resize an image while maintaining aspect ratio
-def resize_image(image, height):
-    ratio = height / image.height
-    width = int(image.width * ratio)
-    return image.resize((width, height))
+    entries = []
+    page = 1
+    page_count = 1
+    while page <= page_count:
+        response = http_cache.get(url, headers=traktheaders, params={'page': page, 'limit': trakt_page_size})
+        if response.status_code != 200:
+            # A partial list would remove the backgrounds of the missing entries, so use none
+            print(f"Error: Unable to fetch list page {page} (status code {response.status_code})")
+            return []
+        for item in response.json():
+            if item['type'] in trakt_media_types:
+                media = item[item['type']]
+                entries.append((trakt_media_types[item['type']], media['title'], media['ids']['tmdb']))
+        page_count = int(response.headers.get('X-Pagination-Page-Count', page))
+        page += 1
+
+    # Shows first, then movies
+    entries.sort(key=lambda entry: entry[0] != 'tv')
+    return entries
+
+# Function to load the TMDB record of every list entry, each exactly once and several at a time
+def resolve_list_items(entries):
+    keys = list(dict.fromkeys((media_type, tmdb_id) for media_type, _, tmdb_id in entries if tmdb_id))
+
+    def load(key):
+        media_type, tmdb_id = key
+        try:
+            return tmdb_items.load_item(media_type, tmdb_id, tmdb_headers, language="en-US",
+                                        image_language="en", ttl=metadata_ttl)
+        except Exception as e:
+            print(f"Error loading TMDB {media_type} {tmdb_id}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, resolve_workers)) as pool:
+        records = dict(zip(keys, pool.map(load, keys)))
+
+    resolved = []
+    for media_type, title, tmdb_id in entries:
+        record = records.get((media_type, tmdb_id))
+        if record is not None:
+            resolved.append((title, record))
+    return resolved
 
 # Function to resize a logo while maintaining aspect ratio
 def resize_logo(image, width, height):
@@ -98,144 +133,129 @@ def resize_logo(image, width, height):
     resized_img = image.resize((new_width, new_height))
     return resized_img
 
-# Function to get details of a TV show from TMDB
-def get_tv_show_details(tv_id):
-    tv_details_url = f'{url}tv/{tv_id}?language=en-US'
-    tv_details_response = requests.get(tv_details_url, headers=tmdb_headers)
-    return tv_details_response.json()
+# Directory to save the backgrounds; unchanged backgrounds are kept between runs and
+# those of titles no longer on the list are removed at the end
+background_dir = "trakt_backgrounds"
+manifest = render_manifest.RenderManifest(background_dir)
 
-# Function to get details of a movie from TMDB
-def get_movie_details(movie_id):
-    movie_details_url = f'{url}movie/{movie_id}?language=en-US'
-    movie_details_response = requests.get(movie_details_url, headers=tmdb_headers)
-    return movie_details_response.json()
+# Background and overlay (aligned top right), composited once for all images
+background_template = template.get_template(overlay_position=None)
 
-# Create a directory to save the backgrounds and clear its contents if it exists
-background_dir = "trakt_backgrounds"
-if os.path.exists(background_dir):
-    shutil.rmtree(background_dir)
-os.makedirs(background_dir, exist_ok=True)
+# The Trakt logo goes on top of the "Now on my ..." text, so it is pasted after it on each image
+trakt_logo = Image.open(os.path.join(template.BASE_PATH, "traktlogo.png")).convert('RGBA')
+trakt_logo_position = (780, 885)
+
+# Fingerprint of the template images, font and output settings shared by every background
+template_fingerprint = render_manifest.template_fingerprint("traktlogo.png", truetype_path, trakt_logo_position)
 
 # Function to fetch and save background images for movies and shows
-def fetch_and_save_background_images(movies, shows):
+def fetch_and_save_background_images(items):
     directory = background_dir
     if not os.path.exists(directory):
         os.makedirs(directory)
     
-    for title, tmdb_id in shows + movies:
-        if tmdb_id:
-            bckg = Image.open(os.path.join(os.path.dirname(__file__), "bckg.png"))
-            overlay = Image.open(os.path.join(os.path.dirname(__file__), "overlay.png"))
-            traktlogo = Image.open(os.path.join(os.path.dirname(__file__), "traktlogo.png"))
-
-            if title in [show[0] for show in shows]:
-                show_data = get_tv_show_details(tmdb_id)
-                media_type = "tv"
-            else:
-                show_data = get_movie_details(tmdb_id)
-                media_type = "movie"
-                
-            backdrop_path = show_data.get("backdrop_path")
-            if backdrop_path:
-                image_url = f"https://image.tmdb.org/t/p/original{backdrop_path}"
-                image_response = requests.get(image_url)
-                if image_response.status_code == 200:
-                    show_image = Image.open(BytesIO(image_response.content))
-                    show_image = resize_image(show_image, 1500)
-                    bckg.paste(show_image, (bckg.width - show_image.width, 0))
-                    draw = ImageDraw.Draw(bckg)
-
-                    # Text font
-                    font_title = ImageFont.truetype(truetype_path, size=190)
-                    font_overview = ImageFont.truetype(truetype_path, size=50)
-                    font_custom = ImageFont.truetype(truetype_path, size=60)
-                    font_info = ImageFont.truetype(truetype_path, size=50)
-
-                    # Text color
-                    shadow_color = "black"
-                    main_color = "white"
-                    overview_color = "white"
-                    metadata_color = (150, 150, 150)
-
-                    # Text position
-                    title_position = (200, 420)
-                    overview_position = (210, 730)
-                    shadow_offset = 2
-                    info_position = (210, 650)
-                    custom_position = (210, 870)
-
-                    #paste overlay
-                    bckg.paste(overlay, (bckg.width - overlay.width, 0), overlay)
-
-                    #paste logo and if no logo exists in english draw show title  
-                    logo_path = get_logo(media_type, tmdb_id)
-                    if logo_path:
-                        logo_url = f"https://image.tmdb.org/t/p/original{logo_path}"
-                        logo_response = requests.get(logo_url)                        
-                        try:
-                            if logo_response.status_code == 200:
-                                logo_image = Image.open(BytesIO(logo_response.content))
-                                logo_image = resize_logo(logo_image, 1000, 500)
-                                logo_image = logo_image.convert("RGBA")
-                                logo_position = (210, info_position[1] - logo_image.height - 25)
-                                bckg.paste(logo_image, logo_position, logo_image)
-                            else:
-                                print(f"Error downloading logo for {title}: status code {logo_response.status_code}")
-                                draw.text(title_position, title, fill="white", font=font_title)
-                        except UnidentifiedImageError:
-                            print(f"Error identifying logo image for {title}")
+    for title, item in items:
+        media_type = item.media_type
+        backdrop_path = item.backdrop_path
+        if backdrop_path:
+            logo = item.logo("en")
+            logo_path = logo["file_path"] if logo else None
+
+            # Keep the existing background if nothing it was made from has changed
+            fingerprint = render_manifest.fingerprint(
+                media_type, item.id, title, backdrop_path, logo_path, list_name, template_fingerprint,
+                [item.genres, item.date, item.runtime, item.number_of_seasons, item.overview],
+                round(item.vote_average or 0, 1),
+            )
+            output_name = f"{clean_filename(title)}{encoder.extension()}"
+            if manifest.is_current(output_name, fingerprint):
+                print(f"Unchanged, keeping: {title}")
+                continue
+
+            image_url = backdrops.tmdb_backdrop_url(backdrop_path, 1500)
+            image_bytes = image_cache.fetch(image_url)
+            if image_bytes:
+                show_image = backdrops.open_backdrop(image_bytes, 1500)
+                # Paste the image right-aligned onto the precomposited background, overlay and Trakt logo
+                bckg = background_template.render(show_image, (background_template.size[0] - show_image.width, 0))
+                draw = ImageDraw.Draw(bckg)
+
+                # Text font
+                font_title = fonts.get_font(truetype_path, 190)
+                font_overview = fonts.get_font(truetype_path, 50)
+                font_custom = fonts.get_font(truetype_path, 60)
+                font_info = fonts.get_font(truetype_path, 50)
+
+                # Text color
+                shadow_color = "black"
+                main_color = "white"
+                overview_color = "white"
+                metadata_color = (150, 150, 150)
+
+                # Text position
+                title_position = (200, 420)
+                overview_position = (210, 730)
+                shadow_offset = 2
+                info_position = (210, 650)
+                custom_position = (210, 870)
+
+                #paste logo and if no logo exists in english draw show title  
+                if logo:
+                    logo_bytes = logos.fetch_tmdb_logo(logo, 1000, 500)
+                    try:
+                        if logo_bytes:
+                            logo_image = Image.open(BytesIO(logo_bytes))
+                            logo_image = resize_logo(logo_image, 1000, 500)
+                            logo_image = logo_image.convert("RGBA")
+                            logo_position = (210, info_position[1] - logo_image.height - 25)
+                            bckg.paste(logo_image, logo_position, logo_image)
+                        else:
+                            print(f"Error downloading logo for {title}")
                             draw.text(title_position, title, fill="white", font=font_title)
-                    else:
+                    except UnidentifiedImageError:
+                        print(f"Error identifying logo image for {title}")
                         draw.text(title_position, title, fill="white", font=font_title)
-
-                    #get metadata
-                    info = ""
-                    overview = ""
-                    if media_type == "movie":
-                        movie_details = get_movie_details(tmdb_id)
-                        genres = ", ".join([genre['name'] for genre in movie_details.get('genres', [])])
-                        year = movie_details.get('release_date', '')[:4]
-                        duration = movie_details.get('runtime', 0)
-                        hours, minutes = divmod(duration, 60)
-                        overview = movie_details.get('overview')
-                        tmdb_score = round(movie_details.get('vote_average', 0),1)
-                        info = f"{genres}  •  {year}  •  {hours}h{minutes}min  •  TMDB: {tmdb_score}"
-                    elif media_type == "tv":
-                        tv_details = get_tv_show_details(tmdb_id)
-                        genres = ", ".join([genre['name'] for genre in tv_details.get('genres', [])])
-                        year = tv_details.get('first_air_date', '')[:4]
-                        seasons = tv_details.get('number_of_seasons', 0)
-                        tmdb_score = round(tv_details.get('vote_average', 0),1)
-                        overview = tv_details.get('overview')
-                        info = f"{genres}  •  {year}  •  {seasons} {'Season' if seasons == 1 else 'Seasons'}  •  TMDB: {tmdb_score}"
-
-                    #draw show info
-                    draw.text((info_position[0] + shadow_offset, info_position[1] + shadow_offset), info, font=font_info, fill=shadow_color)
-                    draw.multiline_text(info_position, info, font=font_info, fill=metadata_color)
-
-                    #draw overview
-                    wrapped_overview = "\n".join(textwrap.wrap(overview, width=70, max_lines=2, placeholder=" ..."))
-                    overview_position = (210, info_position[1] + 70)
-                    draw.text((overview_position[0] + shadow_offset, overview_position[1] + shadow_offset), wrapped_overview, font=font_overview, fill=shadow_color)
-                    draw.multiline_text(overview_position, wrapped_overview, font=font_overview, fill=overview_color)
-
-                    #draw custom text and paste trakt logo
-                    custom_text = f"Now on my {list_name} "
-                    draw.text((custom_position[0] + shadow_offset, custom_position[1] + shadow_offset), custom_text, font=font_custom, fill=shadow_color)
-                    draw.text(custom_position, custom_text, font=font_custom, fill=overview_color)
-                    bckg.paste(traktlogo, (780, 885), traktlogo)
-
-                    #save image
-                    image_path = os.path.join(directory, f"{clean_filename(title)}.jpg")
-                    bckg = bckg.convert('RGB')
-                    bckg.save(image_path, "JPEG")
                 else:
-                    print(f"Error downloading image for {title}: status code {image_response.status_code}")
+                    draw.text(title_position, title, fill="white", font=font_title)
+
+                #get metadata from the record loaded with the list
+                genres = ", ".join(item.genres)
+                year = (item.date or '')[:4]
+                tmdb_score = round(item.vote_average or 0, 1)
+                overview = item.overview
+                info = ""
+                if media_type == "movie":
+                    hours, minutes = divmod(item.runtime or 0, 60)
+                    info = f"{genres}  •  {year}  •  {hours}h{minutes}min  •  TMDB: {tmdb_score}"
+                elif media_type == "tv":
+                    seasons = item.number_of_seasons or 0
+                    info = f"{genres}  •  {year}  •  {seasons} {'Season' if seasons == 1 else 'Seasons'}  •  TMDB: {tmdb_score}"
+
+                #draw show info
+                text_layout.draw_text_with_shadow(bckg, info_position, info, font_info, metadata_color, shadow_color, (shadow_offset, shadow_offset))
+
+                #draw overview
+                wrapped_overview = "\n".join(textwrap.wrap(overview, width=70, max_lines=2, placeholder=" ..."))
+                overview_position = (210, info_position[1] + 70)
+                text_layout.draw_text_with_shadow(bckg, overview_position, wrapped_overview, font_overview, overview_color, shadow_color, (shadow_offset, shadow_offset))
+
+                #draw custom text and paste trakt logo
+                custom_text = f"Now on my {list_name} "
+                text_layout.draw_text_with_shadow(bckg, custom_position, custom_text, font_custom, overview_color, shadow_color, (shadow_offset, shadow_offset), cache=True)
+                bckg.paste(trakt_logo, trakt_logo_position, trakt_logo)
+
+                #save image, the canvas is already RGB
+                manifest.save(bckg, output_name, fingerprint)
             else:
-                print(f"No background image found for {title}")
+                print(f"Error downloading image for {title}")
+        else:
+            print(f"No background image found for {title}")
 
-# Fetch movie and show lists from Trakt API
-movies_list, shows_list = get_trakt_movies_and_shows(trakt_api_key, username, list_name)
+# Fetch the list from Trakt API and load each title's TMDB record once
+list_items = resolve_list_items(get_trakt_list_items(trakt_api_key, username, list_name))
 
 # Fetch and save background images for the movies and shows
-fetch_and_save_background_images(movies_list, shows_list)
+fetch_and_save_background_images(list_items)
+
+# Remove backgrounds of titles that are no longer on the list
+manifest.finish()
@@ -0,0 +1,108 @@
+# === Standard Library Imports ===
+import os
+
+# === Third-Party Imports ===
+from PIL import Image
+
+# === Local Imports ===
+import encoder
+
+# Output resolutions shared by all scripts.
+# The TV boxes range from 4K to 720p, and a 1080p box gains nothing from decoding a 4K
+# file. With OUTPUT_SIZES set (e.g. "3840x2160,1920x1080,1280x720") every background is
+# still composited once at full size, then each size is a cheap reduction of that canvas
+# (a box reduce for whole-number factors like 2x and 3x, Lanczos otherwise) saved in a
+# subfolder named after it, e.g. plex_backgrounds/1920x1080/. Without OUTPUT_SIZES there
+# is a single full-size file in the background folder itself, as before.
+
+# Size of bckg.png, the canvas every background is composited on
+canvas_size = (3840, 2160)
+
+sizes = None
+
+
+def parse_sizes(value, canvas=canvas_size):
+    """
+    Parses "3840x2160,1920x1080" into [(3840, 2160), (1920, 1080)], skipping invalid
+    entries and sizes that would stretch or upscale the canvas.
+    """
+    result = []
+    for entry in (value or '').split(','):
+        entry = entry.strip().lower()
+        if not entry:
+            continue
+        try:
+            width, height = (int(part) for part in entry.split('x'))
+        except ValueError:
+            print(f"[WARNING] Invalid output size {entry}, expected WIDTHxHEIGHT.")
+            continue
+        if width <= 0 or height <= 0:
+            print(f"[WARNING] Invalid output size {entry}, width and height must be positive.")
+            continue
+        if width > canvas[0] or height > canvas[1]:
+            print(f"[WARNING] Skipping output size {entry}, larger than the {canvas[0]}x{canvas[1]} canvas.")
+            continue
+        # Allow a pixel of rounding, e.g. 1366x768 for a 16:9 canvas
+        if abs(width * canvas[1] - height * canvas[0]) > max(canvas):
+            print(f"[WARNING] Skipping output size {entry}, its aspect ratio doesn't match "
+                  f"the {canvas[0]}x{canvas[1]} canvas and it would be stretched.")
+            continue
+        if (width, height) not in result:
+            result.append((width, height))
+    return result
+
+
+def get_sizes():
+    """
+    Returns the output sizes from OUTPUT_SIZES, largest first, or [] for a single full-size output.
+    """
+    global sizes
+    if sizes is None:
+        sizes = sorted(parse_sizes(os.getenv('OUTPUT_SIZES')), reverse=True)
+    return sizes
+
+
+def folder_name(size):
+    """
+    Returns the subfolder of an output size, e.g. "1920x1080".
+    """
+    return f"{size[0]}x{size[1]}"
+
+
+def subfolders(output_sizes=None):
+    """
+    Returns the subfolders outputs are written to, [""] for the background folder itself.
+    """
+    output_sizes = get_sizes() if output_sizes is None else output_sizes
+    return [folder_name(size) for size in output_sizes] or ['']
+
+
+def downscale(image, size):
+    """
+    Reduces a rendered canvas to size. Whole-number factors use Image.reduce, which
+    averages pixel blocks in one pass; other sizes use Lanczos after a reduce step.
+    """
+    if image.size == size:
+        return image
+    factor_x, factor_y = image.width / size[0], image.height / size[1]
+    if factor_x == factor_y and factor_x.is_integer() and factor_x > 1:
+        return image.reduce(int(factor_x))
+    return image.resize(size, Image.LANCZOS, reducing_gap=2.0)
+
+
+def encode(image, output_sizes=None, encoder_settings=None):
+    """
+    Encodes a rendered canvas at every output size.
+
+    :param image: Full-size RGB canvas.
+    :param output_sizes: List of (width, height), defaults to get_sizes(); [] for the canvas only.
+    :param encoder_settings: encoder.EncoderSettings, defaults to those from the environment.
+    :return: Dict of subfolder ("" for the background folder itself) to encoded bytes.
+    """
+    output_sizes = get_sizes() if output_sizes is None else output_sizes
+    if not output_sizes:
+        return {'': encoder.encode(image, encoder_settings)}
+    return {
+        folder_name(size): encoder.encode(downscale(image, size), encoder_settings)
+        for size in output_sizes
+    }